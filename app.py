@@ -1,21 +1,39 @@
 # app.py
 import json
+import time
+import asyncio
+import uuid
 import secrets
-import requests
-from flask import Flask, request, jsonify, render_template
-from func_options import get_current_stock_price, get_company_news, earn_surprises, basic_fin, general_faq
-from forecast import *
+from flask import Flask, Response, request, jsonify, render_template, stream_with_context
+from func_options import get_current_stock_price, get_stock_prices, get_company_news, earn_surprises, basic_fin, screen_stocks, general_faq, general_faq_stream, company_resolver, resolve_ticker, finnhub_client, faq_cache
+from forecast import forecast_stock, forecast_stock_events, forecast_stock_async, preload_dependencies
+from jobs import submit_job, get_job, wait_events
+from http_client import post_json, latency_stats, OPENAI_BASE_URL
+from llm_clients import llm_slots, record_tokens, token_stats
+from semantic_cache import SemanticCache
+from intent_router import IntentRouter
+from batch_forecast import forecast_batch, universe_tickers
+import metrics
+import charts
+import fundamentals_store
+from tool_calls import requested_calls, run_calls, run_calls_async, merge_outcomes, display_name, TOOL_ERROR_MESSAGE
+from metrics import span, timed
 
-# Load configuration from config.json
-with open('config.json') as config_file:
-    config = json.load(config_file)
+from settings import config
+
+# Heavy forecasting/LLM libraries load on first use unless lazy_imports is off,
+# e.g. for pre-fork servers that import the app once before forking workers
+if not config.get("lazy_imports", True):
+    preload_dependencies()
 
 app = Flask(__name__)
 app.secret_key = secrets.token_hex(16)  # Use a securely generated random string
 
 GPT_MODEL = config["GPT_MODEL"]
 # Chat completion functions
-def chat_completion_request(messages, functions=None, function_call=None, model=GPT_MODEL):
+# Pass tools (the tools API) to let the model request several functions in one turn,
+# or functions for the legacy single function_call
+def chat_completion_request(messages, functions=None, function_call=None, model=GPT_MODEL, tools=None):
     headers = {
         "Content-Type": "application/json",
         "Authorization": f"Bearer {config['openai_api_key']}",
@@ -25,26 +43,56 @@ def chat_completion_request(messages, functions=None, function_call=None, model=
         json_data.update({"functions": functions})
     if function_call is not None:
         json_data.update({"function_call": function_call})
+    if tools is not None:
+        json_data.update({"tools": tools, "parallel_tool_calls": True})
     try:
-        response = requests.post(
-            "https://api.openai.com/v1/chat/completions",
-            headers=headers,
-            json=json_data,
-        )
+        with llm_slots:
+            response = post_json(
+                "chat_completion",
+                f"{OPENAI_BASE_URL}/chat/completions",
+                headers=headers,
+                json_data=json_data,
+            )
+        try:
+            record_tokens("chat_completion", response.json().get("usage"))
+        except ValueError:
+            pass
         return response
     except Exception as e:
         print("Unable to generate ChatCompletion response")
         print(f"Exception: {e}")
         return e
 
+# Routing decisions for repeated questions are served from a local cache
+routing_cache = SemanticCache(maxsize=config.get("routing_cache_size", 1000),
+                              threshold=config.get("routing_cache_threshold", 0.85))
+
+# Near-duplicate routes are only safe when they carry no extracted arguments
+# (tickers, dates); general_faq is re-targeted at the new question instead
+def _route_without_entities(assistant_message):
+    return [call["name"] for call in requested_calls(assistant_message)] == ["general_faq"]
+
+def cached_route(user_input):
+    assistant_message = routing_cache.get(user_input, accept=_route_without_entities)
+    if assistant_message is None:
+        return None
+    if _route_without_entities(assistant_message):
+        return {"role": "assistant", "content": None,
+                "function_call": {"name": "general_faq", "arguments": json.dumps({"query": user_input})}}
+    return json.loads(json.dumps(assistant_message))
+
 functions_map = {
     "get_current_stock_price": get_current_stock_price,
+    "get_stock_prices": get_stock_prices,
     "get_company_news": get_company_news,
     "earn_surprises": earn_surprises,
     "basic_fin": basic_fin,
+    "screen_stocks": screen_stocks,
     "general_faq": general_faq,
     "forecast_stock": forecast_stock
 }
+# Every function is timed under its own stage, e.g. function.basic_fin
+functions_map = {name: timed(f"function.{name}")(function) for name, function in functions_map.items()}
 
 functions = [
     {
@@ -61,6 +109,21 @@ functions = [
             "required": ["ticker_symbol"],
         },
     },
+    {
+        "name": "get_stock_prices",
+        "description": "It will get the current stock prices of several US companies at once, e.g. a portfolio or watchlist.",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "ticker_symbols": {
+                    "type": "array",
+                    "items": {"type": "string"},
+                    "description": "These are the symbols (or names) of the companies.",
+                }
+            },
+            "required": ["ticker_symbols"],
+        },
+    },
     {
         "name": "get_company_news",
         "description": "It will get the news related to a company within a specified date range.",
@@ -78,6 +141,11 @@ functions = [
                 "end_date": {
                     "type": "string",
                     "description": "Format: YYYY-MM-DD",
+                },
+                "format": {
+                    "type": "string",
+                    "enum": ["csv", "jsonl"],
+                    "description": "Output file format. Leave blank for CSV.",
                 }
             },
             "required": ["company_name","start_date","end_date"],
@@ -115,6 +183,42 @@ functions = [
             "required": ["company_name"],
         },
     },
+    {
+        "name": "screen_stocks",
+        "description": "Screens and ranks all covered US companies by basic financials, e.g. lowest P/E, highest margins, ROE above a threshold.",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "filters": {
+                    "type": "array",
+                    "items": {
+                        "type": "object",
+                        "properties": {
+                            "metric": {"type": "string", "description": "Finnhub metric name or common name, e.g. peTTM, P/E, net margin, ROE, market cap."},
+                            "op": {"type": "string", "enum": [">", ">=", "<", "<="]},
+                            "value": {"type": "number"}
+                        },
+                        "required": ["metric", "op", "value"]
+                    },
+                    "description": "Conditions every company must meet. Leave empty to rank all companies.",
+                },
+                "sort_by": {
+                    "type": "string",
+                    "description": "Metric to rank by, e.g. P/E, gross margin, dividend yield.",
+                },
+                "order": {
+                    "type": "string",
+                    "enum": ["asc", "desc"],
+                    "description": "asc for lowest first, desc for highest first.",
+                },
+                "limit": {
+                    "type": "integer",
+                    "description": "Number of companies to return. Leave blank for 10.",
+                }
+            },
+            "required": ["sort_by"],
+        },
+    },
     {
         "name": "general_faq",
         "description": "Answers general questions related to personal finance, investing, banking, planning.",
@@ -145,54 +249,78 @@ functions = [
     },
 ]
 
+# Forecasts for the same ticker share one in-flight job
+def forecast_job_key(arguments):
+    company_name = json.loads(arguments).get('company_name', '')
+    return ("forecast_stock", resolve_ticker(company_name).upper())
+
+# Unambiguous queries skip the LLM routing call
+intent_router = IntentRouter(functions, company_resolver,
+                             min_score=config.get("intent_router_min_score", 2.0),
+                             margin=config.get("intent_router_margin", 1.0))
+
+# Component stats exposed as gauges on /metrics
+metrics.register_stats("http", latency_stats)
+metrics.register_stats("llm_tokens", token_stats)
+metrics.register_stats("finnhub_cache", finnhub_client.cache.stats)
+metrics.register_stats("faq_cache", faq_cache.stats)
+metrics.register_stats("routing_cache", routing_cache.stats)
+metrics.register_stats("intent_router", intent_router.stats)
+metrics.register_stats("charts", charts.stats)
+metrics.register_stats("fundamentals_store", fundamentals_store.stats)
+
 @app.route('/')
 def index():
     return render_template('index.html')
 
-@app.route('/chat', methods=['POST'])
-def chat():
-    user_input = request.json.get('user_input')
-
-    if not user_input:
-        return jsonify({"error": "Invalid input"}), 400
-
+# Pick the function to run: local fast path, routing cache, then the LLM
+# Returns (assistant_message, error_message)
+def route_request(user_input):
     # Initialize messages to guide assistant behavior
     messages = [{"role": "system", "content": 
                  "Don't make assumptions about what values to plug into functions. Ask for clarification if a user request is ambiguous."}]
     messages.append({"role": "user", "content": user_input})
 
+    assistant_message = None
+    if config.get("intent_router_enabled", True):
+        with span("route.intent_router"):
+            assistant_message = intent_router.route(user_input)
+        if assistant_message is not None:
+            metrics.increment("routes", source="intent_router")
+            return assistant_message, None
+    with span("route.cache"):
+        assistant_message = cached_route(user_input)
+    if assistant_message is not None:
+        metrics.increment("routes", source="cache")
+        return assistant_message, None
+
     # calling chat_completion_request to call ChatGPT completion endpoint
-    chat_response = chat_completion_request(messages, functions=functions)
+    metrics.increment("routes", source="llm")
+    routing_start = time.perf_counter()
+    with span("route.llm"):
+        if config.get("parallel_tool_calls", True):
+            chat_response = chat_completion_request(messages, tools=[{"type": "function", "function": function} for function in functions])
+        else:
+            chat_response = chat_completion_request(messages, functions=functions)
+    intent_router.record_llm_latency(time.perf_counter() - routing_start)
 
     if isinstance(chat_response, Exception):
-        return jsonify({"response": "An error occurred while generating the response from ChatGPT."})
+        return None, "An error occurred while generating the response from ChatGPT."
 
     try: # parsing ChatGPT response
         assistant_message = chat_response.json()["choices"][0]["message"]
     except Exception as e:
         print(f"Error parsing chat response: {e}")
-        return jsonify({"response": "An error occurred while parsing the response from ChatGPT."})
-
-    # Decide which function to execute based on ChatGPT response
-    fn_name = assistant_message["function_call"]["name"] # extracts name of function based on user input and context
-    arguments = assistant_message["function_call"]["arguments"] # extracts function arguments
-    function = functions_map.get(fn_name)
-    if function:
-        try:
-            result = function(arguments)
-            response_content = result
-        except Exception as e:
-            response_content = "An error occurred while executing the function."
-    else:
-        response_content = "Function not found."
+        return None, "An error occurred while parsing the response from ChatGPT."
 
-    # Append the assistant's second message
-    more_questions_message = "Do you have any more questions I can help with?"
-    func = config[fn_name] + " speaking:"
+    if requested_calls(assistant_message):
+        routing_cache.set(user_input, assistant_message)
+    return assistant_message, None
 
-    explanation = ""
-    if func == "Stock Forecaster":
-        explanation = """
+# Chosen by call name: the speaker label shown to the user combines display names
+def function_explanation(calls):
+    if any(call["name"] == "forecast_stock" for call in calls):
+        return """
                     Forecasting used the SARIMAX model with and without exogenous variables (S&P 500 Index, IRX).\n
                     Exogenous variables often result in less optimistic predictions because they incorporate broader\n
                     market conditions and external economic factors. Specifically, the IRX (13-week Treasury bill rate)\n
@@ -200,18 +328,261 @@ def chat():
                     When the IRX is included in the model, it accounts for the opportunity cost of investing in risk-free\n
                     assets versus stocks. Higher IRX values can indicate increased market risk or tightening monetary\n
                     policy, leading to more conservative (less optimistic) stock price forecasts as investors might prefer\n
-                    safer, lower-return investments.\n\n
-                    When run independently (server-less), forecasting can plot the results with confidence interval
+                    safer, lower-return investments.\n
                     """
-    else:
-        explanation = "It's important to note that the LLM may sometimes provide inaccurate explanations due to its inherent limitations."
+    return "It's important to note that the LLM may sometimes provide inaccurate explanations due to its inherent limitations."
+
+MORE_QUESTIONS_MESSAGE = "Do you have any more questions I can help with?"
+
+# Label for the functions answering this turn, e.g. "Stock Price Retriever & Company News Reporter speaking:"
+def speaker(calls):
+    return " & ".join(display_name(call["name"]) for call in calls) + " speaking:"
+
+@app.route('/chat', methods=['POST'])
+def chat():
+    user_input = request.json.get('user_input')
+
+    if not user_input:
+        return jsonify({"error": "Invalid input"}), 400
+
+    metrics.increment("requests", endpoint="/chat")
+    metrics.start_trace()
+    try:
+        with span("chat.request"):
+            return chat_response(user_input)
+    finally:
+        metrics.end_trace("/chat", log=config.get("trace_requests", False))
+
+def chat_response(user_input):
+    assistant_message, error = route_request(user_input)
+    if error is not None:
+        return jsonify({"response": error})
+
+    # Decide which functions to execute based on ChatGPT response; there may be several
+    calls = requested_calls(assistant_message)
+    if not calls:
+        return jsonify({"response": assistant_message.get("content") or "Function not found."})
+
+    job_ids = []
+    outcomes = {}
+    immediate = []
+    for index, call in enumerate(calls):
+        if call["name"] == "forecast_stock" and config.get("async_forecast", True):
+            # Forecasts take minutes; run them in the background and let the client poll
+            try:
+                job_ids.append(submit_job(functions_map[call["name"]], call["arguments"],
+                                          dedupe_key=forecast_job_key(call["arguments"])))
+                outcomes[index] = {"name": call["name"], "result": "Forecast started, results will appear here when ready."}
+            except Exception as e:
+                metrics.increment("function_errors", function=call["name"])
+                outcomes[index] = {"name": call["name"], "result": TOOL_ERROR_MESSAGE}
+        else:
+            immediate.append(index)
+
+    # The remaining calls run concurrently, so the turn takes about as long as the slowest one
+    for index, outcome in zip(immediate, run_calls([calls[index] for index in immediate], functions_map)):
+        outcomes[index] = outcome
+    response_content, chart_url = merge_outcomes([outcomes[index] for index in range(len(calls))])
+
+    # Append the assistant's second message
+    func = speaker(calls)
 
     return jsonify({
         "func": func,
-        "explanation": explanation,
+        "explanation": function_explanation(calls),
         "response": response_content,
-        "more_questions": more_questions_message
+        "more_questions": MORE_QUESTIONS_MESSAGE,
+        "job_id": job_ids[0] if job_ids else None,
+        "job_ids": job_ids,
+        "chart_url": chart_url
     })
 
+# Async functions used by the async request path; the rest run in worker threads
+async_functions = {
+    "forecast_stock": forecast_stock_async
+}
+async_functions = {name: timed(f"function.{name}")(function) for name, function in async_functions.items()}
+
+# Async version of the /chat pipeline: awaits routing, data-provider and LLM calls
+# and pushes CPU-bound forecasting to the forecast process pool
+# Served as /chat/async by asgi.py only: the shared LLM clients pool connections on one event loop
+@timed("chat.request")
+async def chat_async_pipeline(user_input):
+    metrics.increment("requests", endpoint="/chat/async")
+    assistant_message, error = await asyncio.to_thread(route_request, user_input)
+    if error is not None:
+        return {"response": error}
+
+    calls = requested_calls(assistant_message)
+    if not calls:
+        return {"response": assistant_message.get("content") or "Function not found."}
+
+    outcomes = await run_calls_async(calls, functions_map, async_functions)
+    response_content, chart_url = merge_outcomes(outcomes)
+
+    func = speaker(calls)
+    return {
+        "func": func,
+        "explanation": function_explanation(calls),
+        "response": response_content,
+        "more_questions": MORE_QUESTIONS_MESSAGE,
+        "chart_url": chart_url
+    }
+
+# Functions that can stream (kind, payload) events instead of returning one string
+streaming_functions = {
+    "forecast_stock": forecast_stock_events,
+    "general_faq": general_faq_stream
+}
+streaming_functions = {name: timed(f"function.{name}")(function) for name, function in streaming_functions.items()}
+
+# Payload field carrying each streamed event's value
+STREAM_EVENT_FIELDS = {"progress": "message", "chart": "url", "token": "text"}
+
+def sse_event(kind, payload):
+    return f"event: {kind}\ndata: {json.dumps(payload)}\n\n"
+
+# Server-Sent Events version of /chat: pushes the routed function, progress and LLM tokens as they happen
+@app.route('/chat/stream', methods=['POST'])
+def chat_stream():
+    user_input = request.json.get('user_input')
+
+    if not user_input:
+        return jsonify({"error": "Invalid input"}), 400
+
+    metrics.increment("requests", endpoint="/chat/stream")
+
+    def generate():
+        metrics.start_trace()
+        try:
+            with span("chat.request"):
+                yield from stream_events(user_input)
+        finally:
+            metrics.end_trace("/chat/stream", log=config.get("trace_requests", False))
+
+    return Response(stream_with_context(generate()), mimetype='text/event-stream',
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+# SSE events for one /chat/stream request
+def stream_events(user_input):
+    yield sse_event("progress", {"message": "Thinking..."})
+    assistant_message, error = route_request(user_input)
+    if error is not None:
+        yield sse_event("result", {"response": error})
+        yield sse_event("done", {"more_questions": MORE_QUESTIONS_MESSAGE})
+        return
+
+    calls = requested_calls(assistant_message)
+    if not calls:
+        yield sse_event("result", {"response": assistant_message.get("content") or "Function not found."})
+        yield sse_event("done", {"more_questions": MORE_QUESTIONS_MESSAGE})
+        return
+
+    func = speaker(calls)
+    yield sse_event("func", {"func": func, "explanation": function_explanation(calls)})
+
+    background = config.get("async_forecast", True)
+    if len(calls) == 1 and calls[0]["name"] in streaming_functions and not (background and calls[0]["name"] == "forecast_stock"):
+        fn_name = calls[0]["name"]
+        try:
+            for kind, payload in streaming_functions[fn_name](calls[0]["arguments"]):
+                yield sse_event(kind, {STREAM_EVENT_FIELDS[kind]: payload})
+        except Exception as e:
+            print(f"Error in chat_stream: {e}")
+            metrics.increment("function_errors", function=fn_name)
+            yield sse_event("result", {"response": TOOL_ERROR_MESSAGE})
+    else:
+        # Forecasts take minutes: start them as background jobs first, as /chat does
+        job_ids = []
+        immediate = []
+        for call in calls:
+            if call["name"] == "forecast_stock" and background:
+                try:
+                    job_ids.append(submit_stream_job(call))
+                except Exception as e:
+                    print(f"Error in chat_stream: {e}")
+                    metrics.increment("function_errors", function=call["name"])
+                    yield sse_event("result", {"response": TOOL_ERROR_MESSAGE})
+            else:
+                immediate.append(call)
+
+        # The remaining calls run concurrently while the forecasts are queued or fitting
+        if immediate:
+            if len(immediate) > 1:
+                yield sse_event("progress", {"message": f"Running {len(immediate)} functions..."})
+            response_content, chart_url = merge_outcomes(run_calls(immediate, functions_map))
+            if chart_url is not None:
+                yield sse_event("chart", {"url": chart_url})
+            yield sse_event("result", {"response": response_content})
+        for job_id in job_ids:
+            yield from relay_job_events(job_id)
+    yield sse_event("done", {"more_questions": MORE_QUESTIONS_MESSAGE})
+
+# Queue a streaming function as a background job; requests for the same ticker share one job
+def submit_stream_job(call):
+    return submit_job(streaming_functions[call["name"]], call["arguments"],
+                      dedupe_key=forecast_job_key(call["arguments"]) + ("events",), events=True)
+
+# Relay a background job's events; every request sharing the job sees all of them
+def relay_job_events(job_id):
+    yield sse_event("job", {"job_id": job_id})
+    if (get_job(job_id) or {}).get("status") == "queued":
+        yield sse_event("progress", {"message": "Waiting for a forecast worker..."})
+    seen = 0
+    while True:
+        update = wait_events(job_id, seen)
+        if update is None:
+            yield sse_event("result", {"response": "Job not found."})
+            return
+        events, job = update
+        if not events and job["finished_at"] is None:
+            yield ": keep-alive\n\n" # no event within the wait; keeps proxies from closing the stream
+        for kind, payload in events:
+            yield sse_event(kind, {STREAM_EVENT_FIELDS[kind]: payload})
+        seen += len(events)
+        if job["finished_at"] is not None and not events:
+            if job["status"] == "failed":
+                yield sse_event("result", {"response": job["error"]})
+            return
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    job = get_job(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job)
+
+# Batch forecasts stream one JSON line per ticker as each one finishes
+@app.route('/forecast/batch', methods=['POST'])
+def batch_forecast():
+    body = request.json or {}
+    tickers = universe_tickers() if body.get('all') else body.get('tickers')
+    if not tickers or not isinstance(tickers, list):
+        return jsonify({"error": "Provide a list of tickers or set all to true"}), 400
+
+    output_path = f"batch_forecasts_{uuid.uuid4().hex[:8]}.jsonl"
+
+    def generate():
+        for row in forecast_batch(tickers, output_path=output_path):
+            yield json.dumps(row) + "\n"
+        yield json.dumps({"status": "complete", "output": output_path}) + "\n"
+
+    return Response(generate(), mimetype='application/x-ndjson')
+
+# Forecast charts, rendered on first request and cached per ticker, forecast version and format
+@app.route('/charts/<ticker>/<version>.<fmt>', methods=['GET'])
+def chart(ticker, version, fmt):
+    image = charts.get_chart(ticker, version, fmt)
+    if image is None:
+        return jsonify({"error": "Chart not found"}), 404
+    # A version never changes, so clients may keep it for as long as the server does
+    return Response(image, mimetype=charts.CHART_FORMATS[fmt],
+                    headers={"Cache-Control": f"public, max-age={charts.CHART_TTL}"})
+
+# Prometheus scrape endpoint: stage latency histograms, counters and cache stats
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    return Response(metrics.render_prometheus(), mimetype='text/plain; version=0.0.4')
+
 if __name__ == '__main__':
     app.run(debug=True)
\ No newline at end of file
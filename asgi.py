@@ -0,0 +1,41 @@
+# asgi.py
+import json
+from asgiref.wsgi import WsgiToAsgi
+
+from app import app, chat_async_pipeline
+
+"""ASGI entry point, e.g.
+    uvicorn asgi:application --workers 1
+    /chat/async is served natively on the event loop so concurrent chat sessions
+    share one process; every other route is delegated to the Flask (WSGI) app
+"""
+
+flask_app = WsgiToAsgi(app)
+
+async def _read_body(receive):
+    body = b''
+    while True:
+        message = await receive()
+        body += message.get('body', b'')
+        if not message.get('more_body', False):
+            return body
+
+async def _send_json(send, status, payload):
+    body = json.dumps(payload).encode('utf-8')
+    await send({"type": "http.response.start", "status": status,
+                "headers": [(b"content-type", b"application/json"),
+                            (b"content-length", str(len(body)).encode())]})
+    await send({"type": "http.response.body", "body": body})
+
+async def application(scope, receive, send):
+    if scope["type"] == "http" and scope["path"] == "/chat/async" and scope["method"] == "POST":
+        try:
+            user_input = json.loads(await _read_body(receive) or b'{}').get('user_input')
+        except ValueError:
+            user_input = None
+        if not user_input:
+            await _send_json(send, 400, {"error": "Invalid input"})
+            return
+        await _send_json(send, 200, await chat_async_pipeline(user_input))
+        return
+    await flask_app(scope, receive, send)
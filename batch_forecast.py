@@ -0,0 +1,124 @@
+# batch_forecast.py
+import sys
+import json
+import argparse
+from concurrent.futures import as_completed
+
+from forecast import (load_stock_data, get_exog_series, build_forecast_variants, arima_forecast,
+                      get_forecast_pool, shutdown_forecast_pool, EXOG_SYMBOLS, config)
+from func_options import company_resolver, resolve_ticker
+
+"""Run forecasts for a watchlist or the whole conversions.csv universe
+    python batch_forecast.py AAPL MSFT NVDA --output forecasts.jsonl
+    python batch_forecast.py --all
+"""
+
+# Fit both variants for one ticker and keep only what the output file needs
+# Runs inside a pool worker, so it returns plain lists instead of fitted models
+def forecast_summary(ticker, variants):
+    results = [arima_forecast(**variant) for variant in variants]
+    (_, forecast_with_exog, conf_int_with_exog), (_, forecast_without_exog, conf_int_without_exog) = results
+    stock_data = variants[0]["stock_data"]
+    return {
+        "ticker": ticker,
+        "status": "ok",
+        "last_date": stock_data.index[-1].strftime('%Y-%m-%d'),
+        "last_close": float(stock_data.iloc[-1]),
+        "forecast_with_exog": [float(value) for value in forecast_with_exog],
+        "conf_int_with_exog": [[float(low), float(high)] for low, high in conf_int_with_exog],
+        "forecast_without_exog": [float(value) for value in forecast_without_exog],
+        "conf_int_without_exog": [[float(low), float(high)] for low, high in conf_int_without_exog]
+    }
+
+def _error_row(ticker, e):
+    print(f"Error forecasting {ticker}: {e}")
+    return {"ticker": ticker, "status": "error", "error": str(e)}
+
+# Every ticker in conversions.csv, without duplicates
+def universe_tickers():
+    return company_resolver.tickers()
+
+# Forecast many tickers, yielding one result dict per ticker as soon as it finishes
+# Price data is loaded in this process (the exogenous cache is shared across tickers);
+# the model fits fan out over the forecast process pool
+def forecast_batch(tickers, forecast_periods=30, output_path=None):
+    tickers = [resolve_ticker(ticker) for ticker in tickers]
+    output = open(output_path, 'w', encoding='utf-8') if output_path else None
+    pool = get_forecast_pool()
+    exog_warm = False
+
+    def emit(row):
+        if output is not None:
+            output.write(json.dumps(row) + "\n")
+            output.flush()
+        return row
+
+    def collect(future, ticker):
+        try:
+            return emit(future.result())
+        except Exception as e:
+            return emit(_error_row(ticker, e))
+
+    pending = {}
+    try:
+        for ticker in tickers:
+            try:
+                stock_data = load_stock_data(ticker)
+                if not exog_warm:
+                    # Download the shared exogenous series once for the whole batch
+                    for name in EXOG_SYMBOLS:
+                        get_exog_series(name, stock_data.index.min())
+                    exog_warm = True
+                variants = build_forecast_variants(ticker, stock_data, forecast_periods=forecast_periods)
+            except Exception as e:
+                yield emit(_error_row(ticker, e))
+                continue
+
+            if pool is None:
+                try:
+                    yield emit(forecast_summary(ticker, variants))
+                except Exception as e:
+                    yield emit(_error_row(ticker, e))
+                continue
+
+            pending[pool.submit(forecast_summary, ticker, variants)] = ticker
+            # Stream results that finished while later tickers were loading
+            for future in [future for future in pending if future.done()]:
+                yield collect(future, pending.pop(future))
+
+        for future in as_completed(list(pending)):
+            yield collect(future, pending.pop(future))
+    finally:
+        for future in pending:
+            future.cancel()
+        if output is not None:
+            output.close()
+        if pool is not None and not config.get("forecast_pool_persistent", True):
+            shutdown_forecast_pool()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Batch stock forecasting")
+    parser.add_argument("tickers", nargs="*", help="Tickers or company names to forecast")
+    parser.add_argument("--all", action="store_true", help="Forecast every company in conversions.csv")
+    parser.add_argument("--periods", type=int, default=30, help="Days to forecast")
+    parser.add_argument("--output", default="batch_forecasts.jsonl", help="Consolidated JSON Lines output file")
+    args = parser.parse_args(argv)
+
+    tickers = universe_tickers() if args.all else args.tickers
+    if not tickers:
+        parser.error("provide tickers or --all")
+
+    failed = 0
+    for row in forecast_batch(tickers, forecast_periods=args.periods, output_path=args.output):
+        if row["status"] == "ok":
+            print(f"{row['ticker']}: last close {row['last_close']:.2f}, "
+                  f"forecast {row['forecast_with_exog'][-1]:.2f} (with exog) / "
+                  f"{row['forecast_without_exog'][-1]:.2f} (without exog)")
+        else:
+            failed += 1
+            print(f"{row['ticker']}: {row['error']}")
+    print(f"Forecasts written to {args.output}")
+    return 1 if failed else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,254 @@
+# benchmark.py
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import tracemalloc
+import subprocess
+import numpy as np
+import pandas as pd
+import pmdarima as pm
+
+import forecast
+import model_cache
+import price_store
+
+"""Offline benchmark for the forecasting pipeline
+    python benchmark.py --history 100 250 --tickers 1 3 --output bench_results.json
+    python benchmark.py --compare bench_results.json      # report deltas against an earlier run
+    python benchmark.py --record AAPL MSFT                # record live fixtures (needs API keys)
+Without recorded fixtures, deterministic synthetic ones are generated in bench_fixtures/
+"""
+
+FIXTURE_DIR = "bench_fixtures"
+STAGES = ["load_stock_data", "exo_load", "predict_exo", "arima_forecast", "explain_forecast"]
+SYNTHETIC_TICKERS = ["SYNA", "SYNB", "SYNC", "SYND", "SYNE"]
+SYNTHETIC_ROWS = 1500 # business days of synthetic history
+
+# ---- fixtures ----
+
+def _price_fixture_path(ticker):
+    return os.path.join(FIXTURE_DIR, f"{ticker}.csv")
+
+def _exog_fixture_path(name):
+    return os.path.join(FIXTURE_DIR, f"exog_{name}.csv")
+
+# Record live Alpha Vantage and Yahoo Finance data as fixtures
+def record_fixtures(tickers):
+    os.makedirs(FIXTURE_DIR, exist_ok=True)
+    start = None
+    for ticker in tickers:
+        data = price_store._fetch(ticker)
+        if data is None:
+            print(f"Could not record {ticker}")
+            continue
+        data.to_csv(_price_fixture_path(ticker), index=False)
+        first = data['timestamp'].min()
+        start = first if start is None else min(start, first)
+        print(f"Recorded {len(data)} rows for {ticker}")
+    for name, symbol in forecast.EXOG_SYMBOLS.items():
+        series = forecast._download_close(symbol, start)
+        series.rename_axis('Date').rename('Close').to_csv(_exog_fixture_path(name))
+        print(f"Recorded {len(series)} rows for {name}")
+
+# Deterministic random-walk fixtures for when nothing has been recorded
+def generate_synthetic_fixtures():
+    os.makedirs(FIXTURE_DIR, exist_ok=True)
+    rng = np.random.default_rng(42)
+    dates = pd.bdate_range(end='2024-06-28', periods=SYNTHETIC_ROWS)
+    for i, ticker in enumerate(SYNTHETIC_TICKERS):
+        close = 50 * (i + 1) * np.exp(np.cumsum(rng.normal(0.0003, 0.015, len(dates))))
+        pd.DataFrame({
+            'timestamp': dates,
+            'open': close * (1 + rng.normal(0, 0.003, len(dates))),
+            'high': close * 1.01,
+            'low': close * 0.99,
+            'close': close,
+            'volume': rng.integers(1e6, 5e7, len(dates))
+        }).to_csv(_price_fixture_path(ticker), index=False)
+    exog = {'SP500': 4000 * np.exp(np.cumsum(rng.normal(0.0003, 0.01, len(dates)))),
+            'IRX': np.clip(5 + np.cumsum(rng.normal(0, 0.02, len(dates))), 0, None)}
+    for name, values in exog.items():
+        pd.Series(values, index=pd.Index(dates, name='Date'), name='Close').to_csv(_exog_fixture_path(name))
+
+def fixture_tickers():
+    if not os.path.isdir(FIXTURE_DIR):
+        return []
+    return sorted(name[:-4] for name in os.listdir(FIXTURE_DIR)
+                  if name.endswith('.csv') and not name.startswith('exog_'))
+
+# ---- offline stubs ----
+
+class _StubResponse:
+    def __init__(self, content):
+        self.content = content
+        self.response_metadata = {}
+
+def _stub_llm(messages, name, **kwargs):
+    return _StubResponse("The forecast shows a stable trend.")
+
+def _fixture_fetch(ticker, outputsize='compact'):
+    return pd.read_csv(_price_fixture_path(ticker), parse_dates=['timestamp']).sort_values('timestamp')
+
+def _fixture_download_close(symbol, start_date):
+    name = next(name for name, sym in forecast.EXOG_SYMBOLS.items() if sym == symbol)
+    series = pd.read_csv(_exog_fixture_path(name), index_col='Date', parse_dates=['Date'])['Close']
+    return series[series.index >= pd.Timestamp(start_date)]
+
+# Route every network dependency to fixtures and keep caches in a scratch directory
+def install_offline_stubs(scratch_dir):
+    price_store._fetch = _fixture_fetch
+    price_store.STORE_DIR = os.path.join(scratch_dir, "prices")
+    model_cache.CACHE_DIR = os.path.join(scratch_dir, "models")
+    forecast._download_close = _fixture_download_close
+    forecast.invoke_llm = _stub_llm
+
+# Count pmdarima model fits (auto_arima candidates included)
+_fit_count = 0
+_original_fit = pm.ARIMA.fit
+
+def _counting_fit(self, *args, **kwargs):
+    global _fit_count
+    _fit_count += 1
+    return _original_fit(self, *args, **kwargs)
+
+# ---- measurement ----
+
+def _measure(func, *args, **kwargs):
+    global _fit_count
+    fits_before = _fit_count
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    wall = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, {"wall_s": wall, "peak_mb": peak / 2 ** 20, "fits": _fit_count - fits_before}
+
+def _add(totals, stage, sample):
+    total = totals.setdefault(stage, {"wall_s": 0.0, "peak_mb": 0.0, "fits": 0})
+    total["wall_s"] += sample["wall_s"]
+    total["peak_mb"] = max(total["peak_mb"], sample["peak_mb"])
+    total["fits"] += sample["fits"]
+
+# Run the forecast pipeline stage by stage for each ticker, as forecast_stock does
+def run_case(tickers, history_rows, use_cache):
+    totals = {}
+    forecast._exog_cache.clear()
+    for ticker in tickers:
+        stock_data, sample = _measure(forecast.load_stock_data, ticker, history_rows)
+        _add(totals, "load_stock_data", sample)
+
+        start_date, end_date = stock_data.index.min(), stock_data.index.max()
+        exogenous, sample = _measure(forecast.exo_load, start_date, end_date)
+        _add(totals, "exo_load", sample)
+
+        steps = forecast.model_periods(end_date, 30)
+        exog_forecast, sample = _measure(forecast.predict_exo, exogenous, start_date, steps)
+        _add(totals, "predict_exo", sample)
+
+        m, index_freq = forecast.SEASONAL_PERIOD, forecast.SERIES_FREQUENCY
+        calendar_days = 30 if index_freq != 'D' else None
+        keys = {}
+        if use_cache:
+            keys = {"with": model_cache.cache_key(ticker, list(forecast.EXOG_SYMBOLS), stock_data, m, True, index_freq),
+                    "without": model_cache.cache_key(ticker, [], stock_data, m, True, index_freq)}
+        (model_fit, forecast_with_exog, _), sample = _measure(
+            forecast.arima_forecast, stock_data, exog_data=exogenous, forecasted_exog=exog_forecast.values,
+            forecast_periods=steps, seasonal=True, frequency=m, cache_key=keys.get("with"), calendar_days=calendar_days)
+        _add(totals, "arima_forecast", sample)
+        _, sample = _measure(forecast.arima_forecast, stock_data, forecast_periods=steps, seasonal=True,
+                             frequency=m, cache_key=keys.get("without"), calendar_days=calendar_days)
+        _add(totals, "arima_forecast", sample)
+
+        _, sample = _measure(forecast.explain_forecast, model_fit, forecast_with_exog)
+        _add(totals, "explain_forecast", sample)
+    return totals
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True).stdout.strip()
+    except OSError:
+        return None
+
+def compare(results, previous_path):
+    with open(previous_path) as file:
+        previous = {(case["history_rows"], case["tickers"], case["cached"]): case for case in json.load(file)["cases"]}
+    print(f"\nComparison with {previous_path}:")
+    for case in results["cases"]:
+        old = previous.get((case["history_rows"], case["tickers"], case["cached"]))
+        if old is None:
+            continue
+        for stage in STAGES:
+            new_s, old_s = case["stages"][stage]["wall_s"], old["stages"][stage]["wall_s"]
+            change = (new_s - old_s) / old_s * 100 if old_s else 0.0
+            print(f"  rows={case['history_rows']:<5} tickers={case['tickers']:<3} {stage:<17} "
+                  f"{old_s:9.3f}s -> {new_s:9.3f}s ({change:+.1f}%)")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline forecasting benchmark")
+    parser.add_argument("--history", type=int, nargs="+", default=[100], help="History lengths (rows) to test")
+    parser.add_argument("--tickers", type=int, nargs="+", default=[1], help="Ticker counts to test")
+    parser.add_argument("--cached", action="store_true", help="Also run with the ARIMA order cache warm")
+    parser.add_argument("--output", default="bench_results.json", help="Machine-readable results file")
+    parser.add_argument("--compare", help="Earlier results file to compare against")
+    parser.add_argument("--record", nargs="+", metavar="TICKER", help="Record live fixtures and exit")
+    args = parser.parse_args(argv)
+
+    if args.record:
+        record_fixtures(args.record)
+        return 0
+
+    tickers = fixture_tickers()
+    if not tickers:
+        generate_synthetic_fixtures()
+        tickers = fixture_tickers()
+    if max(args.tickers) > len(tickers):
+        parser.error(f"only {len(tickers)} ticker fixtures available")
+
+    scratch_dir = tempfile.mkdtemp(prefix="finsense_bench_")
+    install_offline_stubs(scratch_dir)
+    pm.ARIMA.fit = _counting_fit
+
+    results = {
+        "created_at": time.strftime('%Y-%m-%dT%H:%M:%S'),
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "series_frequency": forecast.SERIES_FREQUENCY,
+        "seasonal_period": forecast.SEASONAL_PERIOD,
+        "fixtures": tickers,
+        "cases": []
+    }
+    try:
+        for history_rows in args.history:
+            for count in args.tickers:
+                for cached in ([False, True] if args.cached else [False]):
+                    # A warm case reuses the orders cached by the cold run just before it
+                    if not cached:
+                        shutil.rmtree(model_cache.CACHE_DIR, ignore_errors=True)
+                    stages = run_case(tickers[:count], history_rows, use_cache=args.cached)
+                    results["cases"].append({"history_rows": history_rows, "tickers": count,
+                                             "cached": cached, "stages": stages})
+                    print(f"rows={history_rows} tickers={count} cached={cached}")
+                    for stage in STAGES:
+                        sample = stages[stage]
+                        print(f"  {stage:<17} {sample['wall_s']:9.3f}s  peak {sample['peak_mb']:8.2f} MB  "
+                              f"fits {sample['fits']}")
+    finally:
+        pm.ARIMA.fit = _original_fit
+        shutil.rmtree(scratch_dir, ignore_errors=True)
+
+    with open(args.output, 'w') as file:
+        json.dump(results, file, indent=2)
+    print(f"Results written to {args.output}")
+
+    if args.compare:
+        compare(results, args.compare)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
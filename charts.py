@@ -0,0 +1,171 @@
+# charts.py
+import io
+import os
+import re
+import time
+import pickle
+import hashlib
+import numpy as np
+import pandas as pd
+
+from caching import TTLCache
+from price_store import write_atomic
+from settings import config
+
+CHART_FORMATS = {"png": "image/png", "svg": "image/svg+xml"}
+CHART_TTL = config.get("chart_cache_ttl", 24 * 3600) # seconds a forecast's chart stays available
+CHART_HISTORY_ROWS = config.get("chart_history_rows", 180) # past prices drawn before the forecast
+CHART_DIR = config.get("chart_dir", "chart_cache") # forecast data on disk, shared by every worker process
+
+# Forecast data per (ticker, version), and rendered images per (ticker, version, format)
+_chart_data = TTLCache(maxsize=config.get("chart_cache_size", 256), ttl=CHART_TTL)
+_chart_images = TTLCache(maxsize=config.get("chart_cache_size", 256), ttl=CHART_TTL)
+
+# Draw past prices and both forecasts with their confidence intervals onto ax
+def draw_forecast(ax,
+                  stock_data,
+                  forecast_with_exog,
+                  conf_int_with_exog,
+                  forecast_without_exog,
+                  conf_int_without_exog,
+                  title='Stock Price Forecast'):
+    ax.plot(stock_data, label='Past Stock Prices')
+
+    forecast_index = pd.date_range(start=stock_data.index[-1],
+                                   periods=len(forecast_with_exog) + 1,
+                                   freq='D')[1:]
+
+    ax.plot(forecast_index,
+            np.asarray(forecast_with_exog),
+            color='red',
+            linestyle='--',
+            label='ARIMA Forecasted Prices with Exogenous Variables')
+    ax.fill_between(forecast_index,
+                    conf_int_with_exog[:, 0],
+                    conf_int_with_exog[:, 1],
+                    color='red',
+                    alpha=0.3,
+                    label='Confidence Interval with Exogenous Variables')
+
+    ax.plot(forecast_index,
+            np.asarray(forecast_without_exog),
+            color='blue',
+            linestyle='--',
+            label='ARIMA Forecasted Prices without Exogenous Variables')
+    ax.fill_between(forecast_index,
+                    conf_int_without_exog[:, 0],
+                    conf_int_without_exog[:, 1],
+                    color='blue',
+                    alpha=0.3,
+                    label='Confidence Interval without Exogenous Variables')
+
+    ax.set_xlabel('Time')
+    ax.set_ylabel('Stock Price')
+    ax.set_title(title)
+    ax.legend()
+    ax.tick_params(axis='x', labelrotation=20) # Rotate the x-axis labels by 20 degrees
+
+# Render the forecast chart to PNG or SVG bytes
+# Uses a standalone Figure on the Agg canvas: no pyplot global state, no display needed
+def render_forecast(stock_data,
+                    forecast_with_exog,
+                    conf_int_with_exog,
+                    forecast_without_exog,
+                    conf_int_without_exog,
+                    title='Stock Price Forecast',
+                    fmt='png'):
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+    fig = Figure(figsize=(12, 6))
+    FigureCanvasAgg(fig)
+    draw_forecast(fig.add_subplot(), stock_data, forecast_with_exog, conf_int_with_exog,
+                  forecast_without_exog, conf_int_without_exog, title)
+    fig.tight_layout()
+
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format=fmt)
+    return buffer.getvalue()
+
+# Identifies one forecast: the data it was fitted on and the values it produced
+def chart_version(stock_data, forecast_with_exog, forecast_without_exog):
+    digest = hashlib.sha1(str(stock_data.index[-1]).encode('utf-8'))
+    digest.update(np.round(np.asarray(forecast_with_exog, dtype=float), 4).tobytes())
+    digest.update(np.round(np.asarray(forecast_without_exog, dtype=float), 4).tobytes())
+    return digest.hexdigest()[:12]
+
+def _data_path(ticker, version):
+    return os.path.join(CHART_DIR, f"{ticker}_{version}.pkl")
+
+# The forecast data is also written to CHART_DIR so that any worker can serve the chart
+def _save_data(ticker, version, data):
+    os.makedirs(CHART_DIR, exist_ok=True)
+    write_atomic(_data_path(ticker, version), lambda file: pickle.dump(data, file))
+    _evict()
+
+# Forecast data written by any process, or None if missing, unreadable or expired
+def _load_data(ticker, version):
+    if not re.fullmatch(r'[0-9a-f]{12}', version) or os.path.basename(ticker) != ticker:
+        return None
+    path = _data_path(ticker, version)
+    try:
+        if time.time() - os.path.getmtime(path) > CHART_TTL:
+            return None
+        with open(path, 'rb') as file:
+            return pickle.load(file)
+    except (OSError, pickle.UnpicklingError, EOFError):
+        return None
+
+# Remove chart data older than the TTL
+def _evict():
+    try:
+        names = [name for name in os.listdir(CHART_DIR) if name.endswith('.pkl')]
+    except OSError:
+        return
+    cutoff = time.time() - CHART_TTL
+    for name in names:
+        path = os.path.join(CHART_DIR, name)
+        try:
+            if os.path.getmtime(path) < cutoff:
+                os.remove(path)
+        except OSError:
+            pass
+
+# Remember a forecast so its chart can be rendered on request; returns the chart URL path
+def store_chart(ticker,
+                stock_data,
+                forecast_with_exog,
+                conf_int_with_exog,
+                forecast_without_exog,
+                conf_int_without_exog,
+                fmt='png'):
+    ticker = ticker.upper()
+    version = chart_version(stock_data, forecast_with_exog, forecast_without_exog)
+    data = {
+        "stock_data": stock_data.iloc[-CHART_HISTORY_ROWS:],
+        "forecast_with_exog": np.asarray(forecast_with_exog),
+        "conf_int_with_exog": np.asarray(conf_int_with_exog),
+        "forecast_without_exog": np.asarray(forecast_without_exog),
+        "conf_int_without_exog": np.asarray(conf_int_without_exog),
+        "title": f'{ticker} Stock Price Forecast with and without Exogenous Variables'
+    }
+    _chart_data.set((ticker, version), data)
+    _save_data(ticker, version, data)
+    return f"/charts/{ticker}/{version}.{fmt}"
+
+# Rendered chart bytes, or None if the forecast is unknown or expired
+# Each (ticker, version, format) is rendered once, even under concurrent requests
+def get_chart(ticker, version, fmt='png'):
+    if fmt not in CHART_FORMATS:
+        return None
+    data = _chart_data.get((ticker.upper(), version))
+    if data is None:
+        # Forecast run by another worker process
+        data = _load_data(ticker.upper(), version)
+        if data is None:
+            return None
+        _chart_data.set((ticker.upper(), version), data)
+    return _chart_images.get_or_compute((ticker.upper(), version, fmt), lambda: render_forecast(**data, fmt=fmt))
+
+def stats():
+    return {"data": _chart_data.stats(), "images": _chart_images.stats()}
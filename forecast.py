@@ -1,112 +1,199 @@
 import json
-import requests
+import atexit
+import asyncio
+import threading
+import multiprocessing
 import numpy as np
 import pandas as pd
-import pmdarima as pm
-import yfinance as yf
 from datetime import timedelta
-import matplotlib.pyplot as plt
-from langchain_openai import ChatOpenAI
-from langchain_core.messages import HumanMessage
-from sklearn.linear_model import LinearRegression
-
-from func_options import *
-
-"""Un-comment to run forecast.py by itself (serverless) to generate plot
-    forecast_stock('<company name>')
-    if calling using ticker, replace lines 221-227 with 'company_name = arguments'
-"""
-
-# Load configuration from config.json
-with open('config.json') as config_file:
-    config = json.load(config_file)
-
-# Download existing stock data in CSV format
-def load_stock_data(symbol_in):
-    api_key = config["alpha_vantage_key"]
-    symbol = symbol_in
-    url = f'https://www.alphavantage.co/query?function=TIME_SERIES_DAILY&symbol={symbol}&apikey={api_key}&datatype=csv'
-
-    response = requests.get(url)
-
-    if response.status_code == 200:
-        with open(f'{symbol}_stock_data.csv', 'wb') as file:
-            file.write(response.content)
-        print(f"CSV file has been downloaded and saved as '{symbol}_stock_data.csv'.")
-    else:
-        print("Failed to download the CSV file. Please check the URL and API key.")
-
-    data = pd.read_csv(f'{symbol}_stock_data.csv', 
-                       parse_dates=['timestamp'], 
-                       dayfirst=False)
-    data.sort_values('timestamp', inplace=True)
-    data.set_index('timestamp', inplace=True)
-    data = data.asfreq('D')
-    data = data.ffill() # fill in missing values (weekends, holidays)
+from functools import partial
+from concurrent.futures import ProcessPoolExecutor
+
+from func_options import resolve_ticker
+import model_cache
+from llm_clients import invoke_llm, stream_llm, ainvoke_llm, human_message
+import price_store
+import charts
+from metrics import timed, span
+
+from settings import config
+
+# pmdarima (with statsmodels/scikit-learn), yfinance, matplotlib and langchain are
+# imported on first use; preload_dependencies() imports them up front instead
+def preload_dependencies():
+    import pmdarima
+    import yfinance
+    import matplotlib.figure
+    import matplotlib.backends.backend_agg
+    from langchain_openai import ChatOpenAI
+    from langchain_core.messages import HumanMessage
+
+# Index the models are fitted on: 'D' forward-fills weekends and holidays onto a
+# calendar index, 'B' keeps trading days only (about 30% fewer rows to fit)
+SERIES_FREQUENCY = config.get("series_frequency", "D")
+SERIES_OFFSET = pd.tseries.frequencies.to_offset(SERIES_FREQUENCY)
+SEASONAL_PERIODS = {'D': 30, 'B': 21} # about one month of steps on either index
+SEASONAL_PERIOD = config.get("seasonal_period", SEASONAL_PERIODS.get(SERIES_FREQUENCY, 30))
+
+# Load daily stock data from the local price store (refreshed from Alpha Vantage)
+@timed("forecast.load_stock_data")
+def load_stock_data(symbol_in, history_rows=None):
+    data = price_store.load_prices(symbol_in, rows=history_rows or price_store.HISTORY_ROWS)
+    data = data.asfreq(SERIES_FREQUENCY)
+    data = data.ffill() # fill in missing values (weekends and/or holidays)
     return data['close']
 
+# Number of model steps covering the next calendar_days days after last_date
+def model_periods(last_date, calendar_days):
+    if SERIES_FREQUENCY == 'D':
+        return calendar_days
+    future = pd.date_range(start=last_date + timedelta(days=1), periods=calendar_days, freq='D')
+    return max(1, len(pd.date_range(start=future[0], end=future[-1], freq=SERIES_FREQUENCY)))
+
+# Map a forecast on the model index back onto calendar_days calendar dates
+# Days without a model step (weekends, holidays) carry the previous value, as load_stock_data does
+# The interval has no value at the last bar, so days before the first step take the first step's interval
+def to_calendar_days(forecast, conf_int, last_date, last_value, calendar_days):
+    model_index = pd.date_range(start=last_date, periods=len(forecast) + 1, freq=SERIES_FREQUENCY)[1:]
+    calendar_index = pd.date_range(start=last_date + timedelta(days=1), periods=calendar_days, freq='D')
+    values = pd.DataFrame(np.column_stack([np.asarray(forecast), np.asarray(conf_int)]), index=model_index)
+    values.loc[last_date] = [last_value, np.nan, np.nan]
+    values = values.sort_index().reindex(values.index.union(calendar_index)).ffill().bfill().loc[calendar_index]
+    return pd.Series(values[0].to_numpy(), index=calendar_index), values[[1, 2]].to_numpy()
+
+# Exogenous symbols shared by every forecast
+EXOG_SYMBOLS = {'SP500': '^GSPC', 'IRX': '^IRX'}
+
+# Process-wide cache of exogenous bars and their daily-resampled series, one per symbol
+_exog_cache = {}
+_exog_lock = threading.Lock()
+
+def _download_close(ticker, start_date):
+    import yfinance as yf
+    data = yf.download(tickers=ticker, 
+                       start=start_date, 
+                       interval="1d")
+    close = data['Close']
+    if isinstance(close, pd.DataFrame): # newer yfinance returns one column per ticker
+        close = close.iloc[:, 0]
+    return close.dropna()
+
+# Return the cached series for an exog symbol covering start_date
+# Refreshes at most once per day, downloading from the last cached bar on
+def get_exog_series(name, start_date):
+    start_date = pd.Timestamp(start_date)
+    today = pd.Timestamp.today().normalize()
+    with _exog_lock:
+        cached = _exog_cache.get(name)
+        covers_start = cached is not None and len(cached["series"]) > 0 and cached["series"].index[0] <= start_date
+        if covers_start and cached["refreshed_on"] == today:
+            return cached["series"]
+
+        if covers_start:
+            # Download again from the last cached bar on: it may have been today's unfinished bar
+            bars = cached["bars"]
+            new_bars = _download_close(EXOG_SYMBOLS[name], bars.index[-1])
+            if not new_bars.empty:
+                bars = pd.concat([bars[bars.index < new_bars.index[0]], new_bars])
+        else:
+            bars = _download_close(EXOG_SYMBOLS[name], start_date)
+            # yfinance returns an empty frame instead of raising on network errors;
+            # never cache that, so the next call downloads again
+            if bars.empty:
+                raise ValueError(f"No {name} data downloaded from Yahoo Finance")
+        series = bars.asfreq('D').ffill()
+
+        _exog_cache[name] = {"bars": bars, "series": series, "refreshed_on": today}
+        return series
+
 # Load exogenous variables: 1) S&P 500 Index, 2) IRX
+@timed("forecast.exo_load")
 def exo_load(start_date, end_date):
     np.set_printoptions(precision=3, suppress=True)
 
-    sp500 = yf.download(tickers="^GSPC", 
-                        start=start_date, 
-                        end=end_date,
-                        interval="1d")
-    sp500 = sp500['Close'].asfreq('D').ffill()
-
-    irx = yf.download(tickers="^IRX",
-                      start=start_date,
-                      end=end_date,
-                      interval="1d")
-    irx = irx['Close'].asfreq('D').ffill()
-    
-    combined_exog = pd.DataFrame({'SP500': sp500, 'IRX': irx})
-    combined_exog.ffill(inplace=True)
+    # end_date is exclusive, matching yf.download
+    last_date = pd.Timestamp(end_date) - timedelta(days=1)
+    combined_exog = pd.DataFrame({name: get_exog_series(name, start_date)[start_date:last_date].asfreq(SERIES_FREQUENCY)
+                                  for name in EXOG_SYMBOLS})
+    combined_exog = combined_exog.ffill()
     
     exog_data = combined_exog.to_numpy()
     
     return exog_data
 
 # Predict exogenous values for the next 30 days
-def predict_exo(exog_data, start_date, forecast_periods=30):
-    if not isinstance(exog_data, pd.DataFrame):
-        exog_data = pd.DataFrame(exog_data, 
-                                 columns=['SP500', 'IRX'], 
-                                 index=pd.date_range(start=start_date, periods=len(exog_data), freq='D'))
-    
-    exog_data['date_int'] = np.arange(len(exog_data))
-    
-    X_sp500 = exog_data['date_int'].values.reshape(-1, 1)
-    y_sp500 = exog_data['SP500'].values
-    model_sp500 = LinearRegression()
-    model_sp500.fit(X_sp500, y_sp500)
-    
-    y_irx = exog_data['IRX'].values
-    model_irx = LinearRegression()
-    model_irx.fit(X_sp500, y_irx)
-    
-    # Prepare dates for the forecast period
-    last_date_int = exog_data['date_int'].iloc[-1]
-    forecast_dates = np.arange(last_date_int + 1, last_date_int + 1 + forecast_periods).reshape(-1, 1)
-    
-    sp500_forecast = model_sp500.predict(forecast_dates)
-    irx_forecast = model_irx.predict(forecast_dates)
-    
-    forecasted_exog = pd.DataFrame({
-        'SP500': sp500_forecast,
-        'IRX': irx_forecast
-    }, index=pd.date_range(start=exog_data.index[-1] + timedelta(days=1), periods=forecast_periods))
+# One least-squares solve fits a linear trend to every exogenous column at once
+@timed("forecast.predict_exo")
+def predict_exo(exog_data, start_date, forecast_periods=30, columns=None):
+    if isinstance(exog_data, pd.DataFrame):
+        columns = list(exog_data.columns)
+        last_date = exog_data.index[-1]
+    else:
+        last_date = pd.date_range(start=start_date, periods=len(exog_data), freq=SERIES_FREQUENCY)[-1]
+    values = np.asarray(exog_data, dtype=float)
+    if values.ndim == 1:
+        values = values[:, np.newaxis]
+    if columns is None:
+        names = list(EXOG_SYMBOLS)
+        columns = names if len(names) == values.shape[1] else [f"exog_{i}" for i in range(values.shape[1])]
+
+    n_obs = values.shape[0]
+    design = np.column_stack([np.ones(n_obs), np.arange(n_obs)])
+    coef = np.linalg.lstsq(design, values, rcond=None)[0] # rows: intercept, slope
+
+    future_steps = np.arange(n_obs, n_obs + forecast_periods)
+    forecast = coef[0] + np.outer(future_steps, coef[1])
+
+    forecasted_exog = pd.DataFrame(forecast, 
+                                   columns=columns, 
+                                   index=pd.date_range(start=last_date, periods=forecast_periods + 1, freq=SERIES_FREQUENCY)[1:])
     
     return forecasted_exog
     
+# Refit using orders (and warm-start parameters) remembered from an earlier search
+def refit_cached(entry, stock_data, exog_data=None):
+    arima_params = dict(entry["arima_params"])
+    arima_params['start_params'] = entry["start_params"]
+    import pmdarima as pm
+    try:
+        return pm.ARIMA(**arima_params).fit(y=stock_data, X=exog_data)
+    except Exception as e:
+        print(f"Cached ARIMA refit failed, re-running search: {e}")
+        return None
+
+# Append only the bars that arrived since the stored model was fitted
+# Returns None when the stored model cannot be continued from this data
+def update_incremental(entry, stock_data, exog_data=None):
+    model_fit = entry.get("model")
+    last_date = entry.get("last_date")
+    if model_fit is None or last_date is None:
+        return None
+
+    new_mask = np.asarray(stock_data.index > last_date)
+    if new_mask.any():
+        # A gap between the stored model and the new bars means history is missing
+        first_new = stock_data.index[new_mask][0]
+        if first_new > last_date + SERIES_OFFSET:
+            return None
+        try:
+            model_fit.update(stock_data[new_mask], 
+                             X=exog_data[new_mask] if exog_data is not None else None)
+        except Exception as e:
+            print(f"Incremental ARIMA update failed, refitting: {e}")
+            return None
+        print(f"Updated ARIMA model with {int(new_mask.sum())} new bars")
+    return model_fit
+
 # Forecast stock price
 def arima_forecast(stock_data, 
                    exog_data=None,
                    forecasted_exog=None,
                    forecast_periods=30, 
                    seasonal=True, 
-                   frequency=30):
+                   frequency=30,
+                   cache_key=None,
+                   incremental_key=None,
+                   calendar_days=None):
     
     # Settings for exogenous variables
     sarimax_kwargs = {
@@ -114,17 +201,8 @@ def arima_forecast(stock_data,
         'enforce_stationarity': True,
         'enforce_invertibility': True
     }
-    # Automatically determine the best SARIMA parameters using pmdarima
-    auto_model = pm.auto_arima(stock_data, 
-                               seasonal=seasonal, 
-                               m=frequency, 
-                               D=1, 
-                               stepwise=True, 
-                               suppress_warnings=True, 
-                               trace=True,
-                               **sarimax_kwargs)
-    print(auto_model.summary())
-    
+    search_data = stock_data
+
     # Match dimensions
     if exog_data is not None and stock_data.shape[0] != exog_data.shape[0]:
         if stock_data.shape[0] > exog_data.shape[0]:
@@ -132,15 +210,97 @@ def arima_forecast(stock_data,
         else:
             exog_data = exog_data[:stock_data.shape[0]]
 
-    model_fit = auto_model.fit(y=stock_data, X=exog_data if exog_data is not None else None)
+    # Incremental mode: continue the persisted model with the new bars only
+    model_fit = None
+    fitted_at = None
+    if incremental_key is not None:
+        entry = model_cache.load_entry(incremental_key)
+        if entry is not None:
+            model_fit = update_incremental(entry, stock_data, exog_data)
+            if model_fit is not None:
+                fitted_at = entry["fitted_at"]
+
+    # Reuse the cached orders unless the entry expired or the fit degraded
+    if model_fit is None and cache_key is not None:
+        entry = model_cache.load_entry(cache_key)
+        if entry is not None:
+            model_fit = refit_cached(entry, stock_data, exog_data)
+            if model_fit is not None and model_cache.is_degraded(entry, model_fit, len(stock_data)):
+                print("Cached ARIMA orders degraded, re-running search")
+                model_fit = None
+
+    if model_fit is None:
+        import pmdarima as pm
+
+        # Automatically determine the best SARIMA parameters using pmdarima
+        auto_model = pm.auto_arima(search_data, 
+                                   seasonal=seasonal, 
+                                   m=frequency, 
+                                   D=1, 
+                                   stepwise=True, 
+                                   suppress_warnings=True, 
+                                   trace=True,
+                                   **sarimax_kwargs)
+        print(auto_model.summary())
+
+        model_fit = auto_model.fit(y=stock_data, X=exog_data if exog_data is not None else None)
+        if cache_key is not None:
+            model_cache.save_entry(cache_key, model_cache.make_entry(model_fit, len(stock_data)))
+        fitted_at = None
+
+    if incremental_key is not None:
+        model_cache.save_entry(incremental_key, 
+                               model_cache.make_model_entry(model_fit, stock_data.index[-1], fitted_at))
     
     forecast, conf_int = model_fit.predict(n_periods=forecast_periods,
                                            X=forecasted_exog if forecasted_exog is not None else None, 
                                            return_conf_int=True)
+    if calendar_days is not None:
+        forecast, conf_int = to_calendar_days(forecast, conf_int, stock_data.index[-1], stock_data.iloc[-1], calendar_days)
     
     return model_fit, forecast, conf_int
 
-# Plot visualization with both lines
+# Process pool for the CPU-bound SARIMAX fits
+_forecast_pool = None
+_forecast_pool_lock = threading.Lock()
+
+def get_forecast_pool():
+    global _forecast_pool
+    workers = config.get("forecast_workers", 2)
+    if workers <= 1:
+        return None # sequential path
+    with _forecast_pool_lock:
+        if _forecast_pool is None:
+            # spawn keeps workers independent of the Flask process' threads
+            context = multiprocessing.get_context(config.get("forecast_pool_start_method", "spawn"))
+            _forecast_pool = ProcessPoolExecutor(max_workers=workers, mp_context=context)
+        return _forecast_pool
+
+def shutdown_forecast_pool(wait=True):
+    global _forecast_pool
+    with _forecast_pool_lock:
+        if _forecast_pool is not None:
+            _forecast_pool.shutdown(wait=wait)
+            _forecast_pool = None
+
+atexit.register(shutdown_forecast_pool, wait=False)
+
+# Run several arima_forecast variants, in parallel when a pool is configured
+# Each variant is a dict of arima_forecast keyword arguments; results keep their order
+@timed("forecast.fit")
+def run_arima_forecasts(variants):
+    pool = get_forecast_pool()
+    if pool is None:
+        return [arima_forecast(**variant) for variant in variants]
+    try:
+        futures = [pool.submit(arima_forecast, **variant) for variant in variants]
+        return [future.result() for future in futures]
+    finally:
+        # Non-persistent pools live for a single forecast only
+        if not config.get("forecast_pool_persistent", True):
+            shutdown_forecast_pool()
+
+# Plot visualization with both lines and save it to f_name
 def plot_forecast(stock_data, 
                   forecast_with_exog, 
                   conf_int_with_exog, 
@@ -149,123 +309,147 @@ def plot_forecast(stock_data,
                   forecast_periods=30, 
                   title='Stock Price Forecast', 
                   f_name='forecast.png'):
-    plt.figure(figsize=(12, 6))
-    plt.plot(stock_data, label='Past Stock Prices')
-    
-    forecast_index = pd.date_range(start=stock_data.index[-1], 
-                                   periods=forecast_periods + 1, 
-                                   freq='D')[1:]
-    
-    plt.plot(forecast_index, 
-             forecast_with_exog, 
-             color='red', 
-             linestyle='--', 
-             label='ARIMA Forecasted Prices with Exogenous Variables')
-    plt.fill_between(forecast_index, 
-                     conf_int_with_exog[:, 0], 
-                     conf_int_with_exog[:, 1], 
-                     color='red', 
-                     alpha=0.3, 
-                     label='Confidence Interval with Exogenous Variables')
-    
-    plt.plot(forecast_index, 
-             forecast_without_exog, 
-             color='blue', 
-             linestyle='--', 
-             label='ARIMA Forecasted Prices without Exogenous Variables')
-    plt.fill_between(forecast_index, 
-                     conf_int_without_exog[:, 0], 
-                     conf_int_without_exog[:, 1], 
-                     color='blue', 
-                     alpha=0.3, 
-                     label='Confidence Interval without Exogenous Variables')
-    
-    plt.xlabel('Time')
-    plt.ylabel('Stock Price')
-    plt.title(title)
-    plt.legend()
-    plt.xticks(rotation=20)  # Rotate the x-axis labels by 20 degrees
-    plt.tight_layout()  
-
-    plt.savefig(f_name)
-    plt.show()
+    image = charts.render_forecast(stock_data,
+                                   forecast_with_exog[:forecast_periods],
+                                   conf_int_with_exog[:forecast_periods],
+                                   forecast_without_exog[:forecast_periods],
+                                   conf_int_without_exog[:forecast_periods],
+                                   title=title,
+                                   fmt=f_name.rsplit('.', 1)[-1])
+    with open(f_name, 'wb') as f:
+        f.write(image)
 
-# LLM explanation of prediction
-def explain_forecast(model_fit, forecast):
-    summary = model_fit.summary()
+def explanation_prompt(forecast):
     forecast_values = forecast.tolist()
 
     # User can add summary into the prompt for a more comprehensive and technical explanation
-    prompt = f"""
+    return f"""
     The model forecasted the following stock prices for the next {len(forecast_values)} periods:
     {forecast_values}
 
     Respond with the forecasted prices and whether they show an increasing or decreasing trend.
     """
 
-    client = ChatOpenAI(
-        model=config["GPT_MODEL"], 
-        temperature=0.0,
-        openai_api_key=config["openai_api_key"]
-    )
+# LLM explanation of prediction
+@timed("forecast.explain")
+def explain_forecast(model_fit, forecast):
+    summary = model_fit.summary()
+    prompt = explanation_prompt(forecast)
 
-    messages = [HumanMessage(content=prompt)]
-    response = client.invoke(messages)
+    messages = [human_message(prompt)]
+    response = invoke_llm(messages, "explain_forecast")
     content = response.content
     return content
 
+# Streaming variant of explain_forecast, yielding text chunks
+@timed("forecast.explain")
+def stream_explanation(forecast):
+    messages = [human_message(explanation_prompt(forecast))]
+    yield from stream_llm(messages, "explain_forecast")
+
+# Build the with- and without-exogenous arima_forecast variants for a ticker
+# forecast_periods is in calendar days; forecasts come back on calendar dates whatever the model index
+def build_forecast_variants(ticker, stock_data, forecast_periods=30):
+    incremental = config.get("incremental_forecast", False)
+    steps = model_periods(stock_data.index[-1], forecast_periods)
+    calendar_days = forecast_periods if SERIES_FREQUENCY != 'D' else None
+
+    # Load exogenous variables
+    start_date = stock_data.index.min()
+    end_date = stock_data.index.max()
+    exogenous = exo_load(start_date, end_date)
+
+    # Predict exogenous variables
+    exog_forecast = predict_exo(exogenous, start_date, forecast_periods=steps)
+
+    with_exog = {
+        "stock_data": stock_data,
+        "exog_data": exogenous,
+        "forecasted_exog": exog_forecast.values,
+        "forecast_periods": steps,
+        "seasonal": True,
+        "frequency": SEASONAL_PERIOD,
+        "cache_key": model_cache.cache_key(ticker, list(EXOG_SYMBOLS), stock_data, SEASONAL_PERIOD, True, SERIES_FREQUENCY),
+        "incremental_key": model_cache.model_key(ticker, list(EXOG_SYMBOLS), SEASONAL_PERIOD, True, SERIES_FREQUENCY) if incremental else None,
+        "calendar_days": calendar_days
+    }
+    without_exog = {
+        "stock_data": stock_data,
+        "forecast_periods": steps,
+        "seasonal": True,
+        "frequency": SEASONAL_PERIOD,
+        "cache_key": model_cache.cache_key(ticker, [], stock_data, SEASONAL_PERIOD, True, SERIES_FREQUENCY),
+        "incremental_key": model_cache.model_key(ticker, [], SEASONAL_PERIOD, True, SERIES_FREQUENCY) if incremental else None,
+        "calendar_days": calendar_days
+    }
+    return [with_exog, without_exog]
+
 def forecast_stock(arguments):
-    # Load company conversions
-    conversions = load_company_conversions("conversions.csv")
-    
     # Parse arguments
     args = json.loads(arguments)
     company_name = args['company_name']
 
     # Convert company name to ticker if necessary
-    if company_name in conversions:
-        company_name = conversions[company_name]
+    company_name = resolve_ticker(company_name)
 
     stock_data = load_stock_data(company_name)
-    # Load exogenous variables
-    start_date = stock_data.index.min()
-    end_date = stock_data.index.max()
-    exogenous = exo_load(start_date, end_date)
 
-    # Predict exogenous variables
-    exog_forecast = predict_exo(exogenous, start_date, forecast_periods=30)
-
-    # Forecast the next 30 days using ARIMA with exogenous variables
-    model_fit_with_exog, forecast_with_exog, conf_int_with_exog = arima_forecast(stock_data, 
-                                                                                exog_data=exogenous,
-                                                                                forecasted_exog=exog_forecast.values,
-                                                                                forecast_periods=30, 
-                                                                                seasonal=True, 
-                                                                                frequency=30)
-
-    # Forecast the next 30 days using ARIMA without exogenous variables
-    model_fit_without_exog, forecast_without_exog, conf_int_without_exog = arima_forecast(stock_data, 
-                                                                                        forecast_periods=30, 
-                                                                                        seasonal=True, 
-                                                                                        frequency=30)
-
-    """ Un-comment to generate plot
-    # Plot the results
-    plot_forecast(stock_data, 
-                forecast_with_exog, 
-                conf_int_with_exog, 
-                forecast_without_exog, 
-                conf_int_without_exog, 
-                forecast_periods=30, 
-                title='Stock Price Forecast with and without Exogenous Variables', 
-                f_name='forecast.png')
-    
-    return "Forecast graph saved to forecast.png"
-    """
+    # Forecast the next 30 days using ARIMA with and without exogenous variables
+    variants = build_forecast_variants(company_name, stock_data, forecast_periods=30)
+    (model_fit_with_exog, forecast_with_exog, conf_int_with_exog), \
+    (model_fit_without_exog, forecast_without_exog, conf_int_without_exog) = run_arima_forecasts(variants)
+
     # Get the explanation from the LLM for the model with exogenous variables
     explanation_with_exog = explain_forecast(model_fit_with_exog, forecast_with_exog)
-    return explanation_with_exog
+    chart_url = charts.store_chart(company_name, stock_data,
+                                   forecast_with_exog, conf_int_with_exog,
+                                   forecast_without_exog, conf_int_without_exog)
+    return {"response": explanation_with_exog, "chart_url": chart_url}
+
+# Streaming variant of forecast_stock, yielding ("progress", message), ("chart", url) and ("token", text) events
+def forecast_stock_events(arguments):
+    args = json.loads(arguments)
+    company_name = resolve_ticker(args['company_name'])
+
+    yield "progress", f"Loading price history for {company_name}..."
+    stock_data = load_stock_data(company_name)
+
+    yield "progress", "Loading S&P 500 and IRX data..."
+    variants = build_forecast_variants(company_name, stock_data, forecast_periods=30)
+
+    yield "progress", "Fitting SARIMAX models with and without exogenous variables..."
+    (_, forecast_with_exog, conf_int_with_exog), (_, forecast_without_exog, conf_int_without_exog) = run_arima_forecasts(variants)
+    yield "chart", charts.store_chart(company_name, stock_data,
+                                      forecast_with_exog, conf_int_with_exog,
+                                      forecast_without_exog, conf_int_without_exog)
 
+    yield "progress", "Explaining the forecast..."
+    for chunk in stream_explanation(forecast_with_exog):
+        yield "token", chunk
+
+# Async variant of forecast_stock for the async request path
+# Network loads run concurrently in threads, model fits run in the forecast process pool
+async def forecast_stock_async(arguments):
+    args = json.loads(arguments)
+    company_name = resolve_ticker(args['company_name'])
 
+    # Warm the exogenous cache while the price history downloads
+    exog_start = pd.Timestamp.today().normalize() - timedelta(days=2 * price_store.HISTORY_ROWS)
+    stock_data, *_ = await asyncio.gather(asyncio.to_thread(load_stock_data, company_name),
+                                          *(asyncio.to_thread(get_exog_series, name, exog_start) for name in EXOG_SYMBOLS))
+    variants = await asyncio.to_thread(build_forecast_variants, company_name, stock_data, 30)
 
+    loop = asyncio.get_running_loop()
+    pool = get_forecast_pool() # None runs the fits in the default thread executor
+    with span("forecast.fit"):
+        (model_fit_with_exog, forecast_with_exog, conf_int_with_exog), \
+        (_, forecast_without_exog, conf_int_without_exog) = await asyncio.gather(
+            *(loop.run_in_executor(pool, partial(arima_forecast, **variant)) for variant in variants))
 
+    messages = [human_message(explanation_prompt(forecast_with_exog))]
+    with span("forecast.explain"):
+        response = await ainvoke_llm(messages, "explain_forecast")
+    chart_url = charts.store_chart(company_name, stock_data,
+                                   forecast_with_exog, conf_int_with_exog,
+                                   forecast_without_exog, conf_int_without_exog)
+    return {"response": response.content, "chart_url": chart_url}
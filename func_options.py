@@ -1,15 +1,90 @@
 # func_options.py
+import os
+import re
 import csv
+import copy
 import json
+import time
+import uuid
+import bisect
+import threading
 import finnhub
-from datetime import datetime, timezone
-from langchain_openai import ChatOpenAI
-from langchain_core.messages import HumanMessage
+import numpy as np
+from datetime import datetime, timedelta, timezone
+from concurrent.futures import ThreadPoolExecutor
+
+from caching import TTLCache
+from llm_clients import invoke_llm, stream_llm, human_message
+from semantic_cache import SemanticCache
+from metrics import span
+from settings import config
+import fundamentals_store
+
+# Finnhub endpoints that are cached, with their TTL in seconds
+FINNHUB_CACHE_TTL = {
+    "quote": 15,
+    "company_basic_financials": 24 * 3600,
+    "company_earnings": 24 * 3600
+}
+
+# Token bucket that keeps upstream calls under the provider's rate limit
+class RateLimiter:
+    def __init__(self, rate_per_minute, burst):
+        self.fill_rate = rate_per_minute / 60.0
+        self.capacity = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    # Block until a call may be made
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.fill_rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.fill_rate
+            time.sleep(wait)
+
+# Wraps finnhub.Client so repeated calls within an endpoint's TTL share one upstream request
+# and every upstream request goes through the shared rate limiter
+class CachedFinnhubClient:
+    def __init__(self, client, ttls, maxsize=1024, rate_limiter=None):
+        self._client = client
+        self._ttls = ttls
+        self._rate_limiter = rate_limiter
+        self.cache = TTLCache(maxsize=maxsize)
+
+    def __getattr__(self, name):
+        attr = getattr(self._client, name)
+        if not callable(attr):
+            return attr
+
+        def upstream_call(*args, **kwargs):
+            if self._rate_limiter is not None:
+                self._rate_limiter.acquire()
+            with span(f"finnhub.{name}"):
+                return attr(*args, **kwargs)
+
+        ttl = self._ttls.get(name)
+        if ttl is None:
+            return upstream_call
+
+        def cached_call(*args, **kwargs):
+            key = (name, args, tuple(sorted(kwargs.items())))
+            result = self.cache.get_or_compute(key, lambda: upstream_call(*args, **kwargs), ttl=ttl)
+            return copy.deepcopy(result) # callers mutate the records they get back
+        return cached_call
 
 # Initialize the Finnhub client
-with open('config.json') as config_file:
-    config = json.load(config_file)
-finnhub_client = finnhub.Client(api_key=config["finnhub_api_key"])
+finnhub_client = CachedFinnhubClient(finnhub.Client(api_key=config["finnhub_api_key"]),
+                                     {**FINNHUB_CACHE_TTL, **config.get("finnhub_cache_ttl", {})},
+                                     maxsize=config.get("finnhub_cache_size", 1024),
+                                     rate_limiter=RateLimiter(config.get("finnhub_rate_limit_per_minute", 60),
+                                                              config.get("finnhub_rate_limit_burst", 30)))
 
 # Function to get current stock price
 def get_current_stock_price(arguments):
@@ -26,6 +101,39 @@ def get_current_stock_price(arguments):
         print(f"Error in get_current_stock_price: {e}")
         return "An error occurred while fetching the stock price."
 
+# Bounded pool for concurrent quote fan-out; the rate limiter paces the upstream calls
+_quote_executor = ThreadPoolExecutor(max_workers=config.get("quote_workers", 8), thread_name_prefix="quote")
+
+def _fetch_quote(ticker):
+    try:
+        return finnhub_client.quote(ticker)
+    except Exception as e:
+        print(f"Error fetching quote for {ticker}: {e}")
+        return None
+
+# Function to get current stock prices for many tickers at once
+def get_stock_prices(arguments):
+    try:
+        symbols = json.loads(arguments)['ticker_symbols']
+        if isinstance(symbols, str):
+            symbols = re.split(r'[,;\s]+', symbols)
+        tickers = list(dict.fromkeys(resolve_ticker(symbol.strip()) for symbol in symbols if symbol.strip()))
+        if not tickers:
+            return "Please provide at least one ticker symbol."
+
+        quotes = _quote_executor.map(_fetch_quote, tickers)
+
+        lines = [f"{'Ticker':<8}{'Price':>10}{'Change':>10}{'Change %':>10}"]
+        for ticker, quote in zip(tickers, quotes):
+            if not quote or not quote.get('c'):
+                lines.append(f"{ticker:<8}{'n/a':>10}")
+                continue
+            lines.append(f"{ticker:<8}{quote['c']:>10.2f}{quote.get('d') or 0:>+10.2f}{quote.get('dp') or 0:>+9.2f}%")
+        return "\n".join(lines)
+    except Exception as e:
+        print(f"Error in get_stock_prices: {e}")
+        return "An error occurred while fetching the stock prices."
+
 # Function to load company conversions
 def load_company_conversions(filename):
     conversions = {}
@@ -35,41 +143,224 @@ def load_company_conversions(filename):
             conversions[row['company_name']] = row['ticker']
     return conversions
 
+# Lower-case, strip punctuation and drop a leading "the" and trailing corporate suffixes
+_NAME_SUFFIXES = {'inc', 'incorporated', 'corp', 'corporation', 'co', 'company', 'ltd', 'plc', 'holdings', 'group'}
+
+def normalize_company_name(name):
+    words = re.sub(r'[^a-z0-9]+', ' ', str(name).lower()).split()
+    if words and words[0] == 'the':
+        words = words[1:]
+    while words and words[-1] in _NAME_SUFFIXES:
+        words = words[:-1]
+    return ' '.join(words)
+
+# Upper-case words that are far more likely to be acronyms than tickers
+_TICKER_STOPWORDS = {'IPO', 'EPS', 'ETF', 'CEO', 'CFO', 'USA', 'US', 'IRA', 'ROI', 'GDP', 'ALL', 'ARE', 'IT', 'ON', 'OR', 'AI', 'PE'}
+# One-word company names that usually mean something else in a question (indexes, common words)
+_NAME_STOPWORDS = {'ball', 'booking', 'carnival', 'dover', 'dow', 'match', 'nasdaq', 'progressive',
+                   'southern', 'target', 'visa', 'waters'}
+
+def _trigrams(key):
+    padded = f"  {key} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+# Company name/ticker resolver over conversions.csv
+# Built once and rebuilt only when the file's mtime changes
+class CompanyResolver:
+    def __init__(self, filename, fuzzy_threshold=0.5):
+        self.filename = filename
+        self.fuzzy_threshold = fuzzy_threshold
+        self._mtime = None
+        self._lock = threading.Lock()
+
+    def _refresh(self):
+        mtime = os.path.getmtime(self.filename)
+        if mtime == self._mtime:
+            return
+        with self._lock:
+            if mtime == self._mtime:
+                return
+            conversions = load_company_conversions(self.filename)
+            exact = dict(conversions)
+            normalized = {}
+            names_by_ticker = {}
+            trigram_index = {}
+            for name, ticker in conversions.items():
+                key = normalize_company_name(name)
+                normalized.setdefault(key, ticker)
+                names_by_ticker.setdefault(ticker.upper(), name)
+                for gram in _trigrams(key):
+                    trigram_index.setdefault(gram, set()).add(key)
+            # Swap in the new indexes together
+            self._exact, self._normalized = exact, normalized
+            self._names_by_ticker, self._trigram_index = names_by_ticker, trigram_index
+            self._sorted_keys = sorted(normalized)
+            self._mtime = mtime
+
+    # Ticker for a company name or ticker, or None if nothing matches
+    def resolve(self, company_name):
+        self._refresh()
+        if company_name in self._exact:
+            return self._exact[company_name]
+        if str(company_name).upper() in self._names_by_ticker:
+            return str(company_name).upper()
+
+        key = normalize_company_name(company_name)
+        if not key:
+            return None
+        if key in self._normalized:
+            return self._normalized[key]
+
+        # Unique prefix match ("berkshire" -> "berkshire hathaway")
+        start = bisect.bisect_left(self._sorted_keys, key)
+        matches = []
+        for candidate in self._sorted_keys[start:start + 2]:
+            if candidate.startswith(key):
+                matches.append(candidate)
+        if len(matches) == 1:
+            return self._normalized[matches[0]]
+        if matches:
+            return None # ambiguous prefix, let the caller ask for clarification
+
+        # Ticker-like input that is not in the file is passed through, never fuzzed
+        if re.fullmatch(r'[A-Z.]{1,5}', str(company_name).strip()):
+            return None
+        return self._fuzzy(key)
+
+    # Best trigram (Dice coefficient) match above the threshold
+    def _fuzzy(self, key):
+        grams = _trigrams(key)
+        counts = {}
+        for gram in grams:
+            for candidate in self._trigram_index.get(gram, ()):
+                counts[candidate] = counts.get(candidate, 0) + 1
+        best, best_score = None, 0.0
+        for candidate, shared in counts.items():
+            score = 2 * shared / (len(grams) + len(_trigrams(candidate)))
+            if score > best_score:
+                best, best_score = candidate, score
+        if best is None or best_score < self.fuzzy_threshold:
+            return None
+        return self._normalized[best]
+
+    # Tickers of the companies mentioned in free text, longest names first, without duplicates
+    # One-word names must be capitalised and not a common word; bare upper-case words count
+    # as tickers only when they are listed in the file, $TICKER always does
+    def find_companies(self, text):
+        self._refresh()
+        found = []
+        original = re.findall(r'[A-Za-z0-9]+', str(text))
+        words = [word.lower() for word in original]
+        used = [False] * len(words)
+        for size in range(5, 0, -1): # longest company name is five words
+            for start in range(len(words) - size + 1):
+                if any(used[start:start + size]):
+                    continue
+                if size == 1 and (original[start][0].islower() or words[start] in _NAME_STOPWORDS):
+                    continue
+                key = ' '.join(words[start:start + size])
+                if size > 1 and words[start + size - 1] in _NAME_SUFFIXES: # "Booking Holdings"
+                    key = normalize_company_name(key)
+                ticker = self._normalized.get(key)
+                if ticker is not None:
+                    found.append(ticker)
+                    used[start:start + size] = [True] * size
+        for token in re.findall(r'\$[A-Z][A-Z.]{0,4}\b|\b[A-Z][A-Z.]{1,4}\b', str(text)):
+            ticker = token.lstrip('$')
+            if ticker in self._names_by_ticker and (token.startswith('$') or ticker not in _TICKER_STOPWORDS):
+                found.append(ticker)
+        return list(dict.fromkeys(found))
+
+    # Company name for a ticker, or None
+    def name_for(self, ticker):
+        self._refresh()
+        return self._names_by_ticker.get(str(ticker).upper())
+
+    # Every ticker in the file, in file order
+    def tickers(self):
+        self._refresh()
+        return list(self._names_by_ticker)
+
+company_resolver = CompanyResolver("conversions.csv", fuzzy_threshold=config.get("resolver_fuzzy_threshold", 0.5))
+
+# Convert company name to ticker if possible, otherwise pass the input through
+def resolve_ticker(company_name):
+    return company_resolver.resolve(company_name) or company_name
+
+# Fixed schema for exported news rows (Finnhub company_news fields)
+NEWS_FIELDS = ['id', 'datetime', 'category', 'headline', 'source', 'summary', 'url', 'image', 'related']
+EXPORT_DIR = config.get("export_dir", "exports")
+NEWS_CHUNK_DAYS = config.get("news_chunk_days", 30)
+
+# Split an inclusive date range into chunks of at most days days, newest first
+def _date_chunks(start_date, end_date, days):
+    start = datetime.strptime(start_date, '%Y-%m-%d').date()
+    end = datetime.strptime(end_date, '%Y-%m-%d').date()
+    while end >= start:
+        chunk_start = max(start, end - timedelta(days=days - 1))
+        yield chunk_start.isoformat(), end.isoformat()
+        end = chunk_start - timedelta(days=1)
+
+# Yield news rows one page (date chunk) at a time without mutating the API records
+def _news_rows(ticker, start_date, end_date):
+    for chunk_start, chunk_end in _date_chunks(start_date, end_date, NEWS_CHUNK_DAYS):
+        for article in finnhub_client.company_news(ticker, _from=chunk_start, to=chunk_end):
+            row = {field: article.get(field) for field in NEWS_FIELDS}
+            row['datetime'] = datetime.fromtimestamp(article['datetime'], timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+            yield row
+
+# Write rows as they arrive to a per-request file, returning (path, row count)
+# If producing or writing a row fails, the partial file is removed before the error propagates
+def export_rows(rows, fieldnames, prefix, output_format="csv"):
+    os.makedirs(EXPORT_DIR, exist_ok=True)
+    extension = "jsonl" if output_format == "jsonl" else "csv"
+    path = os.path.join(EXPORT_DIR, f"{prefix}_{uuid.uuid4().hex[:8]}.{extension}")
+    count = 0
+    try:
+        with open(path, mode='w', newline='', encoding='utf-8') as file:
+            if extension == "jsonl":
+                for row in rows:
+                    file.write(json.dumps(row) + "\n")
+                    count += 1
+            else:
+                writer = csv.DictWriter(file, fieldnames=fieldnames, extrasaction='ignore')
+                writer.writeheader()
+                for row in rows:
+                    writer.writerow(row)
+                    count += 1
+    except BaseException:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        raise
+    return path, count
+
 # Function to get company news
 def get_company_news(arguments):
     try:
-        # Load company conversions
-        conversions = load_company_conversions("conversions.csv")
-        
         # Parse arguments
         args = json.loads(arguments)
         company_name = args['company_name']
         start_date = args['start_date']
         end_date = args['end_date']
+        output_format = args.get('format', 'csv')
+
+        # Check the dates before anything is fetched or written
+        try:
+            if datetime.strptime(start_date, '%Y-%m-%d') > datetime.strptime(end_date, '%Y-%m-%d'):
+                return "The start date must not be after the end date."
+        except (TypeError, ValueError):
+            return "Dates must be given as YYYY-MM-DD."
 
         # Convert company name to ticker if necessary
-        if company_name in conversions:
-            company_name = conversions[company_name]
+        company_name = resolve_ticker(company_name)
         
-        # Retrieve company news
-        news = finnhub_client.company_news(company_name, _from=start_date, to=end_date)
-        
-        for article in news:
-            article['datetime'] = datetime.fromtimestamp(article['datetime'], timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
-
-        headers = set()
-        for article in news:
-            headers.update(article.keys())
-        headers = list(headers)
+        # Retrieve company news page by page and stream it to this request's file
+        csv_file, count = export_rows(_news_rows(company_name, start_date, end_date), NEWS_FIELDS,
+                                      f"{company_name}_news_{start_date}_{end_date}", output_format)
 
-        csv_file = 'company_news.csv'
-
-        with open(csv_file, mode='w', newline='', encoding='utf-8') as file:
-            writer = csv.DictWriter(file, fieldnames=headers)
-            writer.writeheader()
-            writer.writerows(news)
-
-        output_str = f"News articles on {company_name} from {start_date} to {end_date} written to {csv_file}"
+        output_str = f"{count} news articles on {company_name} from {start_date} to {end_date} written to {csv_file}"
         return output_str
     except Exception as e:
         print(f"Error in get_company_news: {e}")
@@ -78,15 +369,11 @@ def get_company_news(arguments):
 # Function to get earnings surprises
 def earn_surprises(arguments):
     try:
-        # Load company conversions
-        conversions = load_company_conversions("conversions.csv")
-
         args = json.loads(arguments)
         company_name = args.get("company_name")
 
         # Convert company name to ticker if necessary
-        if company_name in conversions:
-            company_name = conversions[company_name]
+        company_name = resolve_ticker(company_name)
         print(company_name)
 
         # Check if 'limit' attribute exists and is not None
@@ -119,15 +406,11 @@ def earn_surprises(arguments):
 # Function to get basic financials
 def basic_fin(arguments):
     try:
-        # Load company conversions
-        conversions = load_company_conversions("conversions.csv")
-
         args = json.loads(arguments)
         company_name = args.get("company_name")
 
         # Convert company name to ticker if necessary
-        if company_name in conversions:
-            company_name = conversions[company_name]
+        company_name = resolve_ticker(company_name)
         print(company_name)
 
         # Fetch basic financial data
@@ -152,8 +435,7 @@ def basic_fin(arguments):
             writer.writeheader()
             for key, records in series_data.items():
                 for record in records:
-                    record["type"] = key
-                    writer.writerow(record)
+                    writer.writerow({"type": key, **record})
 
         with open(metric_csv_file, mode='w', newline='', encoding='utf-8') as file:
             writer = csv.DictWriter(file, fieldnames=["metric", "value"])
@@ -161,6 +443,9 @@ def basic_fin(arguments):
             for key, value in metric_data.items():
                 writer.writerow({"metric": key, "value": value})
 
+        # Keep the metrics queryable across companies (see screen_stocks)
+        fundamentals_store.update_metrics(company_name, metric_data)
+
         output_str = f"Financial series data written to {series_csv_file} and financial metrics written to {metric_csv_file}"
         return output_str
 
@@ -168,22 +453,141 @@ def basic_fin(arguments):
         print(f"Error in basic_fin: {e}")
         return "An error occurred while fetching and writing the basic financial data."
 
+# Fetch basic financials for tickers missing from the fundamentals store or stale there
+# Returns how many tickers were refreshed
+def refresh_fundamentals(tickers):
+    refreshed = 0
+    for ticker in fundamentals_store.stale_tickers(tickers):
+        try:
+            basics = finnhub_client.company_basic_financials(ticker, "all")
+            fundamentals_store.update_metrics(ticker, basics.get("metric", {}))
+            refreshed += 1
+        except Exception as e:
+            print(f"Error refreshing fundamentals for {ticker}: {e}")
+    return refreshed
+
+# Common names for Finnhub metric keys used by the screener
+SCREEN_METRIC_ALIASES = {
+    "pe": "peTTM", "p/e": "peTTM", "pe ratio": "peTTM", "price to earnings": "peTTM",
+    "pb": "pbAnnual", "p/b": "pbAnnual", "price to book": "pbAnnual",
+    "ps": "psTTM", "p/s": "psTTM", "price to sales": "psTTM",
+    "eps": "epsTTM",
+    "gross margin": "grossMarginTTM",
+    "operating margin": "operatingMarginTTM",
+    "net margin": "netProfitMarginTTM", "profit margin": "netProfitMarginTTM",
+    "roe": "roeTTM", "return on equity": "roeTTM",
+    "roa": "roaTTM", "return on assets": "roaTTM",
+    "dividend yield": "dividendYieldIndicatedAnnual",
+    "market cap": "marketCapitalization", "market capitalization": "marketCapitalization",
+    "beta": "beta",
+    "52 week high": "52WeekHigh", "52-week high": "52WeekHigh",
+    "52 week low": "52WeekLow", "52-week low": "52WeekLow",
+    "revenue growth": "revenueGrowthTTMYoy",
+    "debt to equity": "totalDebt/totalEquityAnnual"
+}
+SCREEN_OPERATORS = {">": np.greater, ">=": np.greater_equal, "<": np.less, "<=": np.less_equal}
+
+# Map a metric name or alias onto a stored column, case-insensitively
+def _screen_column(metric, columns):
+    key = str(metric).strip()
+    if key in columns:
+        return key
+    alias = SCREEN_METRIC_ALIASES.get(key.lower())
+    if alias in columns:
+        return alias
+    by_lower = {column.lower(): column for column in columns}
+    return by_lower.get(key.lower()) or by_lower.get(str(alias).lower())
+
+# Function to filter and rank the conversions.csv universe by stored basic financials
+def screen_stocks(arguments):
+    try:
+        args = json.loads(arguments)
+        filters = args.get("filters") or []
+        limit = int(args.get("limit") or 10)
+        ascending = str(args.get("order", "desc")).lower().startswith("asc")
+
+        frame = fundamentals_store.metrics_frame(company_resolver.tickers())
+        if frame.empty:
+            return "No basic financials stored yet. Ask for a company's basic financials first, or run fundamentals_store.py --all."
+        columns = list(frame.columns)
+        values = frame.to_numpy()
+
+        # Every filter is one vectorized comparison over the whole universe; NaN never passes
+        mask = np.ones(len(frame), dtype=bool)
+        shown = []
+        for condition in filters:
+            column = _screen_column(condition.get("metric"), columns)
+            operator = SCREEN_OPERATORS.get(condition.get("op", ">"))
+            if column is None or operator is None:
+                return f"Unknown metric or operator in filter: {json.dumps(condition)}"
+            with np.errstate(invalid='ignore'):
+                mask &= operator(values[:, columns.index(column)], float(condition.get("value")))
+            shown.append(column)
+
+        sort_column = _screen_column(args.get("sort_by"), columns) if args.get("sort_by") else (shown[0] if shown else None)
+        if args.get("sort_by") and sort_column is None:
+            return f"Unknown metric to sort by: {args.get('sort_by')}"
+        if sort_column is not None and sort_column not in shown:
+            shown.insert(0, sort_column)
+
+        rows = np.flatnonzero(mask)
+        if sort_column is not None:
+            keys = values[rows, columns.index(sort_column)]
+            keys = np.where(np.isnan(keys), np.inf, keys if ascending else -keys) # missing values sort last
+            rows = rows[np.argsort(keys, kind='stable')]
+        rows = rows[:limit]
+
+        lines = [f"Screened {len(frame)} stored companies, {int(mask.sum())} matched."]
+        lines.append(f"{'Ticker':<8}" + "".join(f"{column:>24}" for column in shown))
+        for row in rows:
+            cells = (values[row, columns.index(column)] for column in shown)
+            lines.append(f"{frame.index[row]:<8}" + "".join(f"{'n/a' if np.isnan(cell) else f'{cell:.2f}':>24}" for cell in cells))
+        return "\n".join(lines)
+    except Exception as e:
+        print(f"Error in screen_stocks: {e}")
+        return "An error occurred while screening stocks."
+
+# Answers to near-identical questions are served from a local cache
+faq_cache = SemanticCache(maxsize=config.get("faq_cache_size", 1000),
+                          threshold=config.get("faq_cache_threshold", 0.8))
+
+def faq_prompt(query):
+    return (
+        f"Generate information related to {query}.\n"
+        "Keep your response to less than 100 words."
+    )
+
 # Function to answer general financial questions
 def general_faq(arguments):
     try:
         query = json.loads(arguments)["query"]
-        prompt = (
-            f"Generate information related to {query}.\n"
-            "Keep your response to less than 100 words."
-        )
-        client = ChatOpenAI(
-            model=config["GPT_MODEL"], temperature=0.0,
-            openai_api_key=config['openai_api_key']
-        )
-        messages = [HumanMessage(content=prompt)]
-        response = client.invoke(messages)
+        cached = faq_cache.get(query)
+        if cached is not None:
+            return cached
+        prompt = faq_prompt(query)
+        messages = [human_message(prompt)]
+        response = invoke_llm(messages, "general_faq")
         content = response.content
+        faq_cache.set(query, content)
         return content
 
     except Exception as e:
         return "An error occurred while fetching answers on this topic."
+
+# Streaming variant of general_faq, yielding ("token", text) events
+def general_faq_stream(arguments):
+    try:
+        query = json.loads(arguments)["query"]
+        cached = faq_cache.get(query)
+        if cached is not None:
+            yield "token", cached
+            return
+        messages = [human_message(faq_prompt(query))]
+        chunks = []
+        for chunk in stream_llm(messages, "general_faq"):
+            chunks.append(chunk)
+            yield "token", chunk
+        faq_cache.set(query, ''.join(chunks))
+    except Exception as e:
+        print(f"Error in general_faq_stream: {e}")
+        yield "token", "An error occurred while fetching answers on this topic."
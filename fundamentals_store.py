@@ -0,0 +1,171 @@
+# fundamentals_store.py
+import os
+import time
+import fcntl
+import argparse
+import threading
+import numpy as np
+import pandas as pd
+from contextlib import contextmanager
+
+from price_store import write_atomic
+from settings import config
+
+"""Columnar store of Finnhub basic-financials metrics, one row per ticker
+    python fundamentals_store.py AAPL MSFT NVDA
+    python fundamentals_store.py --all
+"""
+
+STORE_DIR = config.get("fundamentals_store_dir", "fundamentals_store")
+REFRESH_TTL = config.get("fundamentals_ttl", 24 * 3600) # seconds before a ticker's metrics are stale
+STORE_PATH = os.path.join(STORE_DIR, "fundamentals.npz")
+LOCK_PATH = STORE_PATH + ".lock"
+
+_lock = threading.Lock()
+_state = None # {"tickers": [...], "rows": {ticker: row}, "columns": [...], "cols": {metric: col}, "values", "fetched_at", "version"}
+
+# Changes whenever the file is replaced, by this process or another one (CLI, other workers)
+def _file_version():
+    try:
+        info = os.stat(STORE_PATH)
+    except OSError:
+        return None
+    return info.st_ino, info.st_mtime_ns
+
+# Serializes read-modify-write of the store across processes (web workers, the CLI)
+# The lock lives in a sidecar file because the store itself is replaced on every write
+@contextmanager
+def _store_lock():
+    os.makedirs(STORE_DIR, exist_ok=True)
+    with open(LOCK_PATH, 'a') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+def _build(tickers, columns, values, fetched_at, version):
+    return {
+        "tickers": tickers,
+        "rows": {ticker: row for row, ticker in enumerate(tickers)},
+        "columns": columns,
+        "cols": {metric: col for col, metric in enumerate(columns)},
+        "values": values,
+        "fetched_at": fetched_at,
+        "version": version
+    }
+
+# A missing file is an empty store; an unreadable or inconsistent one raises ValueError
+def _load():
+    version = _file_version()
+    if version is None:
+        return _build([], [], np.empty((0, 0)), np.empty(0), None)
+    try:
+        with np.load(STORE_PATH) as data:
+            tickers = [str(ticker) for ticker in data["tickers"]]
+            columns = [str(column) for column in data["columns"]]
+            values = np.array(data["values"], order='F')
+            fetched_at = np.array(data["fetched_at"])
+    except (OSError, ValueError, KeyError) as e:
+        raise ValueError(f"Fundamentals store {STORE_PATH} is unreadable: {e}")
+    if values.shape != (len(tickers), len(columns)) or len(fetched_at) != len(tickers):
+        raise ValueError(f"Fundamentals store {STORE_PATH} is inconsistent")
+    return _build(tickers, columns, values, fetched_at, version)
+
+# Reloaded whenever the file changes, so updates always start from what is on disk
+def _get_state():
+    global _state
+    if _state is None or _file_version() != _state["version"]:
+        _state = _load()
+    return _state
+
+def _persist(state):
+    os.makedirs(STORE_DIR, exist_ok=True)
+    # All arrays go into one file that is swapped in with a single rename
+    # Column-major values so each metric is a contiguous slice
+    write_atomic(STORE_PATH, lambda file: np.savez(file,
+                                                  tickers=np.array(state["tickers"], dtype=str),
+                                                  columns=np.array(state["columns"], dtype=str),
+                                                  values=np.asfortranarray(state["values"]),
+                                                  fetched_at=state["fetched_at"]))
+    state["version"] = _file_version()
+
+# Store the numeric metrics of one ticker (the "metric" block of company_basic_financials)
+# Metrics not seen before become new columns; other tickers read NaN there
+def update_metrics(ticker, metric_data):
+    ticker = str(ticker).upper()
+    numeric = {key: float(value) for key, value in (metric_data or {}).items()
+               if isinstance(value, (int, float)) and not isinstance(value, bool)}
+    with _lock, _store_lock():
+        try:
+            state = _get_state()
+        except ValueError as e:
+            # Never overwrite a store that could not be read
+            print(f"{e}; not storing metrics for {ticker}")
+            return
+        new_columns = [key for key in numeric if key not in state["cols"]]
+        if new_columns:
+            for key in new_columns:
+                state["cols"][key] = len(state["columns"])
+                state["columns"].append(key)
+            padding = np.full((len(state["tickers"]), len(new_columns)), np.nan)
+            state["values"] = np.asfortranarray(np.hstack([state["values"], padding]))
+
+        row = state["rows"].get(ticker)
+        if row is None:
+            row = state["rows"][ticker] = len(state["tickers"])
+            state["tickers"].append(ticker)
+            state["values"] = np.asfortranarray(np.vstack([state["values"], np.full((1, len(state["columns"])), np.nan)]))
+            state["fetched_at"] = np.append(state["fetched_at"], 0.0)
+
+        state["values"][row, :] = np.nan
+        for key, value in numeric.items():
+            state["values"][row, state["cols"][key]] = value
+        state["fetched_at"][row] = time.time()
+        _persist(state)
+
+# Tickers among the given ones whose metrics are missing or older than the refresh TTL
+def stale_tickers(tickers):
+    with _lock:
+        state = _get_state()
+        cutoff = time.time() - REFRESH_TTL
+        return [ticker for ticker in tickers
+                if ticker.upper() not in state["rows"] or state["fetched_at"][state["rows"][ticker.upper()]] < cutoff]
+
+# Snapshot of the store as a DataFrame: one row per ticker, one column per metric
+def metrics_frame(tickers=None):
+    with _lock:
+        state = _get_state()
+        frame = pd.DataFrame(state["values"].copy(), index=pd.Index(state["tickers"], name="ticker"),
+                             columns=list(state["columns"]))
+    if tickers is not None:
+        frame = frame[frame.index.isin([ticker.upper() for ticker in tickers])]
+    return frame
+
+def stats():
+    with _lock:
+        state = _get_state()
+        cutoff = time.time() - REFRESH_TTL
+        return {
+            "tickers": len(state["tickers"]),
+            "metrics": len(state["columns"]),
+            "stale": int((state["fetched_at"] < cutoff).sum())
+        }
+
+def main():
+    from func_options import company_resolver, refresh_fundamentals, resolve_ticker
+
+    parser = argparse.ArgumentParser(description="Fill the fundamentals store from Finnhub")
+    parser.add_argument("tickers", nargs="*", help="Tickers or company names to refresh")
+    parser.add_argument("--all", action="store_true", help="Refresh every company in conversions.csv")
+    args = parser.parse_args()
+    tickers = company_resolver.tickers() if args.all else [resolve_ticker(ticker) for ticker in args.tickers]
+    if not tickers:
+        parser.error("provide tickers or --all")
+
+    # Calls go through the rate-limited Finnhub client, so a full refresh takes a while
+    refreshed = refresh_fundamentals(tickers)
+    print(f"Refreshed {refreshed} of {len(tickers)} tickers; store: {stats()}")
+
+if __name__ == "__main__":
+    main()
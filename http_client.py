@@ -0,0 +1,78 @@
+# http_client.py
+import time
+import threading
+import requests
+from collections import deque
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from settings import config
+
+# Point at a local stub server for testing, e.g. "http://127.0.0.1:8001/v1"
+OPENAI_BASE_URL = config.get("openai_base_url", "https://api.openai.com/v1")
+HTTP_TIMEOUT = (config.get("http_connect_timeout", 5), config.get("http_read_timeout", 120)) # seconds
+LATENCY_SAMPLES = 1000 # samples kept per call name
+
+# Shared keep-alive session, created on first use
+_session = None
+_session_lock = threading.Lock()
+
+def get_session():
+    global _session
+    with _session_lock:
+        if _session is None:
+            # Bounded retries with exponential backoff on connect errors, rate limits and server errors
+            # A read timeout is never replayed: the server may already have processed (and billed) the POST
+            retry = Retry(total=config.get("http_max_retries", 3),
+                          read=0,
+                          other=0,
+                          backoff_factor=config.get("http_backoff_factor", 0.5),
+                          status_forcelist=(429, 500, 502, 503, 504),
+                          allowed_methods=frozenset(["GET", "POST"]),
+                          respect_retry_after_header=True,
+                          raise_on_status=False)
+            adapter = HTTPAdapter(pool_connections=config.get("http_pool_connections", 4),
+                                  pool_maxsize=config.get("http_pool_size", 16),
+                                  max_retries=retry)
+            session = requests.Session()
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _session = session
+        return _session
+
+# Per-call latency metrics
+_latencies = {}
+_latency_lock = threading.Lock()
+
+def record_latency(name, seconds, status_code=None):
+    with _latency_lock:
+        stats = _latencies.setdefault(name, {"samples": deque(maxlen=LATENCY_SAMPLES), "count": 0, "errors": 0})
+        stats["samples"].append(seconds)
+        stats["count"] += 1
+        if status_code is None or status_code >= 400:
+            stats["errors"] += 1
+
+def latency_stats():
+    with _latency_lock:
+        summary = {}
+        for name, stats in _latencies.items():
+            samples = sorted(stats["samples"])
+            summary[name] = {
+                "count": stats["count"],
+                "errors": stats["errors"],
+                "p50": samples[len(samples) // 2] if samples else None,
+                "p95": samples[min(len(samples) - 1, int(len(samples) * 0.95))] if samples else None,
+                "max": samples[-1] if samples else None
+            }
+        return summary
+
+# POST a JSON body through the shared session, recording latency under name
+def post_json(name, url, headers=None, json_data=None, timeout=None):
+    start = time.perf_counter()
+    try:
+        response = get_session().post(url, headers=headers, json=json_data, timeout=timeout or HTTP_TIMEOUT)
+    except Exception:
+        record_latency(name, time.perf_counter() - start)
+        raise
+    record_latency(name, time.perf_counter() - start, response.status_code)
+    return response
@@ -0,0 +1,133 @@
+# intent_router.py
+import re
+import json
+import time
+import threading
+
+# Strong keyword cues per function; only the best matching cue of a function counts
+INTENT_KEYWORDS = {
+    "forecast_stock": {"forecast": 3.0, "predict": 3.0, "prediction": 3.0, "projection": 3.0, "future price": 3.0},
+    "earn_surprises": {"earnings surprise": 3.0, "earnings": 2.5, "eps": 2.5, "beat estimates": 2.5},
+    "basic_fin": {"basic financials": 3.0, "financials": 2.5, "fundamentals": 2.5, "p/e": 2.5, "pe ratio": 2.5,
+                  "margin": 2.5, "52-week": 2.5, "52 week": 2.5},
+    "get_company_news": {"news": 2.5, "headlines": 2.5, "articles": 2.5},
+    "screen_stocks": {"screen": 3.0, "screener": 3.0, "rank": 3.0, "lowest": 2.5, "highest": 2.5,
+                      "top companies": 2.5, "which companies": 2.5, "which stocks": 2.5},
+    "get_current_stock_price": {"price": 2.0, "quote": 2.0, "trading at": 2.0}
+}
+# Functions that have a multi-company counterpart taking a list of tickers
+MULTI_TICKER_FUNCTIONS = {"get_current_stock_price": "get_stock_prices"}
+DESCRIPTION_WEIGHT = 0.25 # weak cue per word shared with a function's schema description
+QUESTION_PATTERN = re.compile(r"^(what|what's|whats|how|why|when|should|can|is|are|explain|tell me|define)\b|\?\s*$", re.I)
+# How/why-style questions about a forecast ask for reasoning, not for running one
+EXPLANATORY_PATTERN = re.compile(r"^(how|why|explain)\b|\b(why|explain|what if|affects?|affected|impacts?|influences?|causes?)\b", re.I)
+DATE_PATTERN = re.compile(r"\b\d{4}-\d{2}-\d{2}\b")
+LIMIT_PATTERN = re.compile(r"\b(?:last|past|previous)\s+(\d+)\s+quarters?\b", re.I)
+STOPWORDS = {"it", "will", "the", "of", "a", "an", "to", "and", "or", "this", "is", "such", "as", "etc",
+             "get", "given", "related", "within", "into", "us", "we", "want"}
+
+def _words(text):
+    return {word.rstrip('s') for word in re.findall(r"[a-z0-9/]+", text.lower()) if word not in STOPWORDS}
+
+# Local fast-path router: dispatches unambiguous queries without the LLM routing call
+class IntentRouter:
+    def __init__(self, functions, resolver, min_score=2.0, margin=1.0):
+        self.resolver = resolver
+        self.min_score = min_score
+        self.margin = margin
+        self.schemas = {function["name"]: function for function in functions}
+        self.description_words = {name: _words(function["description"]) for name, function in self.schemas.items()}
+        self._lock = threading.Lock()
+        self.fast_path = 0
+        self.fallback = 0
+        self.llm_latency = None # moving average of the LLM routing call, in seconds
+
+    def _score(self, text):
+        lowered = text.lower()
+        words = _words(text)
+        scores = {}
+        for name in self.schemas:
+            if name == "general_faq" or name in MULTI_TICKER_FUNCTIONS.values():
+                continue
+            cues = [weight for keyword, weight in INTENT_KEYWORDS.get(name, {}).items()
+                    if re.search(rf"(?<![a-z]){re.escape(keyword)}", lowered)]
+            scores[name] = max(cues, default=0.0) + DESCRIPTION_WEIGHT * len(words & self.description_words[name])
+        return scores
+
+    # Fill the function's required arguments, or return None if any is missing
+    def _arguments(self, name, user_input, ticker):
+        properties = self.schemas[name]["parameters"]["properties"]
+        dates = DATE_PATTERN.findall(user_input)
+        values = {}
+        if ticker is not None:
+            values["ticker_symbol"] = ticker
+            values["company_name"] = ticker
+        if len(dates) == 2:
+            values["start_date"], values["end_date"] = sorted(dates)
+        limit = LIMIT_PATTERN.search(user_input)
+        if limit:
+            values["limit"] = limit.group(1)
+        values["query"] = user_input
+
+        arguments = {key: values[key] for key in properties if key in values}
+        if any(key not in arguments for key in self.schemas[name]["parameters"].get("required", [])):
+            return None
+        return arguments
+
+    def _classify(self, user_input):
+        tickers = self.resolver.find_companies(user_input)
+        scores = self._score(user_input)
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+        best, best_score = ranked[0] if ranked else (None, 0.0)
+        runner_up = ranked[1][1] if len(ranked) > 1 else 0.0
+
+        if not tickers:
+            # No company and no data intent: a general question
+            if best_score < self.min_score and "general_faq" in self.schemas and QUESTION_PATTERN.search(user_input.strip()):
+                return "general_faq", {"query": user_input}
+            return None
+        if best_score < self.min_score or best_score - runner_up < self.margin:
+            return None
+        if best == "forecast_stock" and EXPLANATORY_PATTERN.search(user_input):
+            # Forecasts take minutes; leave explanatory questions to the LLM
+            return None
+        if len(tickers) > 1:
+            multi = MULTI_TICKER_FUNCTIONS.get(best)
+            if multi not in self.schemas:
+                return None
+            return multi, {"ticker_symbols": tickers}
+        arguments = self._arguments(best, user_input, tickers[0])
+        return (best, arguments) if arguments is not None else None
+
+    # Returns an assistant message shaped like the LLM's, or None to fall back to the LLM
+    def route(self, user_input):
+        start = time.perf_counter()
+        decision = self._classify(user_input)
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            if decision is None:
+                self.fallback += 1
+                return None
+            self.fast_path += 1
+            saved = (self.llm_latency - elapsed) if self.llm_latency is not None else None
+        name, arguments = decision
+        if saved is not None:
+            print(f"Fast-path routed to {name} in {elapsed * 1000:.1f} ms (saved ~{saved * 1000:.0f} ms)")
+        return {"role": "assistant", "content": None,
+                "function_call": {"name": name, "arguments": json.dumps(arguments)}}
+
+    # Feed the latency of LLM routing calls so savings can be estimated
+    def record_llm_latency(self, seconds):
+        with self._lock:
+            self.llm_latency = seconds if self.llm_latency is None else 0.9 * self.llm_latency + 0.1 * seconds
+
+    def stats(self):
+        with self._lock:
+            total = self.fast_path + self.fallback
+            return {
+                "fast_path": self.fast_path,
+                "fallback": self.fallback,
+                "hit_rate": self.fast_path / total if total else 0.0,
+                "avg_llm_routing_ms": self.llm_latency * 1000 if self.llm_latency is not None else None,
+                "estimated_saved_ms": self.fast_path * self.llm_latency * 1000 if self.llm_latency is not None else None
+            }
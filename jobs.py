@@ -0,0 +1,101 @@
+# jobs.py
+import time
+import uuid
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from settings import config
+
+JOB_WORKERS = config.get("job_workers", 2)
+JOB_RESULT_TTL = config.get("job_result_ttl", 3600) # seconds finished jobs stay fetchable
+
+# In-process job registry; no external broker required
+_executor = None
+_jobs = {} # job id -> job record
+_inflight = {} # dedupe key -> job id of a queued/running job
+_lock = threading.Lock()
+_changed = threading.Condition(_lock) # notified on every new event and when a job finishes
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=JOB_WORKERS, thread_name_prefix="job")
+    return _executor
+
+# Drop finished jobs whose results have been kept long enough
+def _prune(now):
+    expired = [job_id for job_id, job in _jobs.items()
+               if job["finished_at"] is not None and now - job["finished_at"] > JOB_RESULT_TTL]
+    for job_id in expired:
+        del _jobs[job_id]
+
+def _run_job(job_id, func, arguments, events):
+    with _lock:
+        _jobs[job_id]["status"] = "running"
+        _jobs[job_id]["started_at"] = time.time()
+    try:
+        if events:
+            result = None
+            for event in func(arguments):
+                with _changed:
+                    _jobs[job_id]["events"].append(event)
+                    _changed.notify_all()
+        else:
+            result = func(arguments)
+        status, error = "done", None
+    except Exception as e:
+        print(f"Error in job {job_id}: {e}")
+        result, status, error = None, "failed", "An error occurred while executing the function."
+    with _lock:
+        job = _jobs[job_id]
+        job.update({"status": status, "result": result, "error": error, "finished_at": time.time()})
+        if _inflight.get(job["dedupe_key"]) == job_id:
+            del _inflight[job["dedupe_key"]]
+        _changed.notify_all()
+
+# Queue func(arguments) and return a job id at once
+# A job with the same dedupe key that is still queued or running is reused
+# With events=True, func yields (kind, payload) events that are recorded for wait_events
+def submit_job(func, arguments, dedupe_key=None, events=False):
+    with _lock:
+        now = time.time()
+        _prune(now)
+        if dedupe_key is not None and dedupe_key in _inflight:
+            return _inflight[dedupe_key]
+
+        job_id = uuid.uuid4().hex
+        _jobs[job_id] = {
+            "job_id": job_id,
+            "status": "queued",
+            "result": None,
+            "error": None,
+            "events": [],
+            "dedupe_key": dedupe_key,
+            "created_at": now,
+            "started_at": None,
+            "finished_at": None
+        }
+        if dedupe_key is not None:
+            _inflight[dedupe_key] = job_id
+    _get_executor().submit(_run_job, job_id, func, arguments, events)
+    return job_id
+
+# Return a snapshot of the job, or None if it is unknown or expired
+def get_job(job_id):
+    with _lock:
+        job = _jobs.get(job_id)
+        if job is None:
+            return None
+        return {key: value for key, value in job.items() if key not in ("dedupe_key", "events")}
+
+# Events of a job from index start on, waiting up to timeout seconds for one to arrive
+# Returns (events, job snapshot), or None if the job is unknown or expired
+def wait_events(job_id, start=0, timeout=15.0):
+    with _changed:
+        job = _jobs.get(job_id)
+        if job is None:
+            return None
+        if len(job["events"]) <= start and job["finished_at"] is None:
+            _changed.wait(timeout)
+        events = list(job["events"][start:])
+        return events, {key: value for key, value in job.items() if key not in ("dedupe_key", "events")}
@@ -0,0 +1,107 @@
+# llm_clients.py
+import time
+import asyncio
+import threading
+from http_client import record_latency, HTTP_TIMEOUT, OPENAI_BASE_URL
+
+from settings import config
+
+# Caps concurrent LLM calls across the process (langchain clients and raw chat completions)
+llm_slots = threading.BoundedSemaphore(config.get("llm_max_concurrency", 8))
+
+# Shared clients keyed by (model, temperature); each keeps its own connection pool
+# Async calls must all run on one event loop (asgi.py), since pooled connections belong to it
+_clients = {}
+_clients_lock = threading.Lock()
+
+def get_chat_model(model=None, temperature=0.0):
+    from langchain_openai import ChatOpenAI # imported on first use, it takes about a second
+
+    key = (model or config["GPT_MODEL"], temperature)
+    with _clients_lock:
+        if key not in _clients:
+            _clients[key] = ChatOpenAI(
+                model=key[0],
+                temperature=temperature,
+                openai_api_key=config["openai_api_key"],
+                base_url=OPENAI_BASE_URL,
+                timeout=HTTP_TIMEOUT[1],
+                max_retries=config.get("http_max_retries", 3)
+            )
+        return _clients[key]
+
+def human_message(content):
+    from langchain_core.messages import HumanMessage
+    return HumanMessage(content=content)
+
+# Token usage per call name
+_token_usage = {}
+_token_lock = threading.Lock()
+
+def record_tokens(name, usage):
+    if not usage:
+        return
+    with _token_lock:
+        totals = _token_usage.setdefault(name, {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0})
+        for field in totals:
+            totals[field] += usage.get(field, 0) or 0
+
+def token_stats():
+    with _token_lock:
+        return {name: dict(totals) for name, totals in _token_usage.items()}
+
+# Invoke the shared chat model, recording latency and token usage under name
+def invoke_llm(messages, name, model=None, temperature=0.0):
+    client = get_chat_model(model, temperature)
+    with llm_slots:
+        start = time.perf_counter()
+        try:
+            response = client.invoke(messages)
+        except Exception:
+            record_latency(name, time.perf_counter() - start)
+            raise
+        record_latency(name, time.perf_counter() - start, 200)
+    record_tokens(name, (response.response_metadata or {}).get("token_usage"))
+    return response
+
+# Stream the shared chat model's reply chunk by chunk, recording latency under name
+def stream_llm(messages, name, model=None, temperature=0.0):
+    client = get_chat_model(model, temperature)
+    with llm_slots:
+        start = time.perf_counter()
+        first_token = None
+        try:
+            for chunk in client.stream(messages):
+                if first_token is None:
+                    first_token = time.perf_counter() - start
+                    record_latency(f"{name}_first_token", first_token, 200)
+                if chunk.content:
+                    yield chunk.content
+        except Exception:
+            record_latency(name, time.perf_counter() - start)
+            raise
+        record_latency(name, time.perf_counter() - start, 200)
+
+# Async variant of invoke_llm; waits for a slot without blocking the event loop
+async def ainvoke_llm(messages, name, model=None, temperature=0.0):
+    client = get_chat_model(model, temperature)
+    acquire = asyncio.ensure_future(asyncio.to_thread(llm_slots.acquire))
+    try:
+        await asyncio.shield(acquire)
+    except asyncio.CancelledError:
+        # Cancelled while waiting (e.g. a tool timeout): the worker thread still
+        # takes the slot, so give it back as soon as it does
+        acquire.add_done_callback(lambda _: llm_slots.release())
+        raise
+    try:
+        start = time.perf_counter()
+        try:
+            response = await client.ainvoke(messages)
+        except Exception:
+            record_latency(name, time.perf_counter() - start)
+            raise
+        record_latency(name, time.perf_counter() - start, 200)
+    finally:
+        llm_slots.release()
+    record_tokens(name, (response.response_metadata or {}).get("token_usage"))
+    return response
@@ -0,0 +1,133 @@
+# metrics.py
+import re
+import json
+import time
+import inspect
+import functools
+import threading
+from contextlib import contextmanager
+
+# Histogram buckets in seconds, from fast cache hits to multi-minute SARIMAX searches
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+_histograms = {} # stage -> {"buckets": [...], "sum": float, "count": int}
+_counters = {} # (name, labels) -> value
+_stats_sources = {} # name -> callable returning a dict of numbers
+_lock = threading.Lock()
+_trace = threading.local() # spans of the request handled by this thread
+
+def observe(stage, seconds):
+    with _lock:
+        histogram = _histograms.setdefault(stage, {"buckets": [0] * len(BUCKETS), "sum": 0.0, "count": 0})
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                histogram["buckets"][i] += 1
+        histogram["sum"] += seconds
+        histogram["count"] += 1
+
+def increment(name, value=1, **labels):
+    key = (name, tuple(sorted(labels.items())))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+# Time a block of work as one stage
+@contextmanager
+def span(stage):
+    spans = getattr(_trace, "spans", None)
+    depth = getattr(_trace, "depth", 0)
+    _trace.depth = depth + 1
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        _trace.depth = depth
+        observe(stage, elapsed)
+        if spans is not None:
+            spans.append({"stage": stage, "depth": depth, "ms": round(elapsed * 1000, 2)})
+
+# Decorator form of span; generator functions are timed until they are exhausted
+def timed(stage):
+    def decorator(func):
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return await func(*args, **kwargs)
+                finally:
+                    observe(stage, time.perf_counter() - start)
+            return async_wrapper
+
+        if inspect.isgeneratorfunction(func):
+            @functools.wraps(func)
+            def generator_wrapper(*args, **kwargs):
+                with span(stage):
+                    yield from func(*args, **kwargs)
+            return generator_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(stage):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+# Per-request trace: collect every span opened by this thread until end_trace
+def start_trace():
+    _trace.spans = []
+    _trace.depth = 0
+
+def end_trace(label, log=False):
+    spans = getattr(_trace, "spans", None)
+    _trace.spans = None
+    if spans is not None and log:
+        print(json.dumps({"trace": label, "spans": spans}))
+    return spans
+
+# Expose a component's stats() dict (cache hit counts etc.) as gauges
+def register_stats(name, source):
+    _stats_sources[name] = source
+
+def _metric_name(*parts):
+    return re.sub(r'[^a-zA-Z0-9_]', '_', '_'.join(parts))
+
+def _labels(pairs):
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{key}="{value}"' for key, value in pairs) + "}"
+
+def _flatten(prefix, stats):
+    for key, value in stats.items():
+        if isinstance(value, dict):
+            yield from _flatten(f"{prefix}_{key}", value)
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            yield _metric_name(prefix, key), value
+
+# Prometheus text exposition format
+def render_prometheus():
+    lines = []
+    with _lock:
+        histograms = {stage: dict(h, buckets=list(h["buckets"])) for stage, h in _histograms.items()}
+        counters = dict(_counters)
+
+    lines.append("# TYPE finsense_stage_duration_seconds histogram")
+    for stage, histogram in sorted(histograms.items()):
+        for bound, count in zip(BUCKETS, histogram["buckets"]):
+            lines.append(f'finsense_stage_duration_seconds_bucket{{stage="{stage}",le="{bound}"}} {count}')
+        lines.append(f'finsense_stage_duration_seconds_bucket{{stage="{stage}",le="+Inf"}} {histogram["count"]}')
+        lines.append(f'finsense_stage_duration_seconds_sum{{stage="{stage}"}} {histogram["sum"]:.6f}')
+        lines.append(f'finsense_stage_duration_seconds_count{{stage="{stage}"}} {histogram["count"]}')
+
+    for (name, labels), value in sorted(counters.items()):
+        lines.append(f"finsense_{_metric_name(name)}_total{_labels(labels)} {value}")
+
+    for source_name, source in sorted(_stats_sources.items()):
+        try:
+            stats = source()
+        except Exception as e:
+            print(f"Error collecting {source_name} stats: {e}")
+            continue
+        for metric, value in _flatten(f"finsense_{source_name}", stats):
+            lines.append(f"{metric} {value}")
+    return "\n".join(lines) + "\n"
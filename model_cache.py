@@ -0,0 +1,124 @@
+# model_cache.py
+import os
+import json
+import time
+import pickle
+import hashlib
+
+from settings import config
+
+CACHE_DIR = config.get("model_cache_dir", "model_cache")
+CACHE_TTL = config.get("model_cache_ttl", 7 * 24 * 3600) # seconds before a full re-search
+CACHE_SIZE = config.get("model_cache_size", 256) # max entries kept on disk (LRU)
+AIC_TOLERANCE = config.get("model_cache_aic_tolerance", 0.05) # allowed relative AIC drift
+
+# Build a cache key from ticker, exogenous set and data window
+# The window is described by its length rather than its dates so that a
+# sliding daily window keeps hitting the same entry until the TTL expires
+def cache_key(ticker, exog_names, stock_data, frequency, seasonal, index_freq='D'):
+    raw = json.dumps({
+        "ticker": str(ticker).upper(),
+        "exog": sorted(exog_names) if exog_names else [],
+        "window": int(len(stock_data)),
+        "index": index_freq,
+        "m": int(frequency),
+        "seasonal": bool(seasonal)
+    }, sort_keys=True)
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+# Key for the persisted incremental model, which spans every window of a ticker
+def model_key(ticker, exog_names, frequency, seasonal, index_freq='D'):
+    raw = json.dumps({
+        "ticker": str(ticker).upper(),
+        "exog": sorted(exog_names) if exog_names else [],
+        "index": index_freq,
+        "m": int(frequency),
+        "seasonal": bool(seasonal),
+        "incremental": True
+    }, sort_keys=True)
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+def _entry_path(key):
+    return os.path.join(CACHE_DIR, f"{key}.pkl")
+
+# Return a cached entry, or None if missing, unreadable or expired
+def load_entry(key):
+    path = _entry_path(key)
+    try:
+        with open(path, 'rb') as file:
+            entry = pickle.load(file)
+    except (OSError, pickle.UnpicklingError, EOFError):
+        return None
+
+    if time.time() - entry.get("fitted_at", 0) > CACHE_TTL:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        return None
+
+    # File mtime doubles as the LRU timestamp
+    try:
+        os.utime(path, None)
+    except OSError:
+        pass
+    return entry
+
+# Atomically write an entry, then evict least recently used entries
+def save_entry(key, entry):
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    path = _entry_path(key)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as file:
+        pickle.dump(entry, file)
+    os.replace(tmp_path, path) # concurrent writers never see a partial file
+    _evict()
+
+def _evict():
+    try:
+        names = [name for name in os.listdir(CACHE_DIR) if name.endswith('.pkl')]
+    except OSError:
+        return
+    if len(names) <= CACHE_SIZE:
+        return
+
+    paths = [os.path.join(CACHE_DIR, name) for name in names]
+    mtimes = {}
+    for path in paths:
+        try:
+            mtimes[path] = os.path.getmtime(path)
+        except OSError:
+            pass
+    for path in sorted(mtimes, key=mtimes.get)[:len(mtimes) - CACHE_SIZE]:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+# Summarize a fitted pmdarima model so it can be rebuilt without a search
+def make_entry(model_fit, n_obs):
+    return {
+        "arima_params": model_fit.get_params(),
+        "start_params": model_fit.params(),
+        "aic_per_obs": model_fit.aic() / max(n_obs, 1),
+        "fitted_at": time.time()
+    }
+
+# Fit diagnostics degrade when the model fails to converge or its AIC
+# drifts noticeably above the one recorded when the orders were chosen
+def is_degraded(entry, model_fit, n_obs):
+    retvals = getattr(model_fit.arima_res_, 'mle_retvals', None) or {}
+    if not retvals.get('converged', True):
+        return True
+    aic_per_obs = model_fit.aic() / max(n_obs, 1)
+    cached = entry["aic_per_obs"]
+    return aic_per_obs - cached > AIC_TOLERANCE * abs(cached)
+
+# Persist a fitted model together with the last bar it has seen
+# fitted_at is carried over on updates so the TTL still forces a periodic full refit
+def make_model_entry(model_fit, last_date, fitted_at=None):
+    return {
+        "model": model_fit,
+        "last_date": last_date,
+        "fitted_at": fitted_at if fitted_at is not None else time.time()
+    }
@@ -0,0 +1,159 @@
+# price_store.py
+import io
+import os
+import json
+import threading
+import requests
+import numpy as np
+import pandas as pd
+from datetime import datetime, timezone
+
+from settings import config
+
+STORE_DIR = config.get("price_store_dir", "price_store")
+HISTORY_ROWS = config.get("price_history_rows", 100) # rows served to the forecaster
+COMPACT_ROWS = 100 # bars in an Alpha Vantage 'compact' response
+COLUMNS = ['open', 'high', 'low', 'close', 'volume']
+
+# One lock per ticker so concurrent requests never interleave a refresh
+_locks = {}
+_locks_lock = threading.Lock()
+
+def _lock_for(symbol):
+    with _locks_lock:
+        return _locks.setdefault(symbol, threading.Lock())
+
+def _meta_path(symbol):
+    return os.path.join(STORE_DIR, f"{symbol.upper()}_meta.json")
+
+# Each write goes to a new generation of files; the meta file names the current one
+def _data_paths(symbol, generation):
+    base = os.path.join(STORE_DIR, f"{symbol.upper()}_{generation}")
+    return f"{base}_dates.npy", f"{base}_values.npy"
+
+# Write a file through write(file) to a temporary path, then move it into place atomically
+def write_atomic(path, write, mode='wb'):
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, mode) as file:
+        write(file)
+    os.replace(tmp_path, path)
+
+def _save_array(path, array):
+    write_atomic(path, lambda file: np.save(file, array))
+
+# Memory-mapped (dates, values) arrays for a ticker, or None if not stored yet
+# Dates and values come from the same generation, so they always belong together
+def read_prices(symbol):
+    for _ in range(2): # a writer may remove the previous generation between reading meta and the files
+        generation = _read_meta(symbol).get("generation")
+        if generation is None:
+            return None
+        dates_path, values_path = _data_paths(symbol, generation)
+        try:
+            dates = np.load(dates_path, mmap_mode='r')
+            values = np.load(values_path, mmap_mode='r')
+        except (OSError, ValueError):
+            continue
+        if len(dates) == len(values):
+            return dates, values
+    return None
+
+def _read_meta(symbol):
+    try:
+        with open(_meta_path(symbol)) as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return {}
+
+# Download daily bars from Alpha Vantage without touching the working directory
+# 'compact' returns the latest 100 bars, 'full' the whole history
+def _fetch(symbol, outputsize='compact'):
+    api_key = config["alpha_vantage_key"]
+    url = f'https://www.alphavantage.co/query?function=TIME_SERIES_DAILY&symbol={symbol}&apikey={api_key}&datatype=csv&outputsize={outputsize}'
+    response = requests.get(url)
+    if response.status_code != 200:
+        print("Failed to download the CSV file. Please check the URL and API key.")
+        return None
+
+    data = pd.read_csv(io.BytesIO(response.content),
+                       parse_dates=['timestamp'],
+                       dayfirst=False) if response.content.startswith(b'timestamp') else None
+    if data is None:
+        # Alpha Vantage reports errors and rate limits as JSON with a 200 status
+        print(f"Alpha Vantage returned no price data for {symbol}: {response.text[:200]}")
+        return None
+    data.sort_values('timestamp', inplace=True)
+    return data
+
+# Merge the latest bars into the stored history, at most once per day per ticker
+def update_prices(symbol, min_rows=HISTORY_ROWS):
+    with _lock_for(symbol):
+        today = datetime.now(timezone.utc).date().isoformat()
+        meta = _read_meta(symbol)
+        stored = read_prices(symbol)
+        if stored is not None and meta.get("fetched_on") == today:
+            return
+
+        # A compact fetch holds COMPACT_ROWS bars, so a longer window needs the whole history
+        # once; "complete" marks a store that already received it
+        needs_full = (min_rows > COMPACT_ROWS and not meta.get("complete")
+                      and (stored is None or len(stored[0]) < min_rows))
+
+        fetched = _fetch(symbol, outputsize='full') if needs_full else None
+        complete = fetched is not None
+        if fetched is None:
+            fetched = _fetch(symbol) # also the fallback when the full history is unavailable
+        if fetched is None:
+            return
+
+        new_dates = fetched['timestamp'].to_numpy(dtype='datetime64[ns]')
+        new_values = fetched[COLUMNS].to_numpy(dtype=np.float64)
+        if stored is not None and not complete and len(stored[0]) and len(new_dates) and new_dates[0] > stored[0][-1]:
+            # The compact window no longer reaches the stored tail, so bars in between are missing.
+            # Refetch the whole history; failing that, drop the stale prefix rather than keep a hole
+            print(f"Price store for {symbol} has a gap after {stored[0][-1]}, refetching the full history.")
+            full = _fetch(symbol, outputsize='full')
+            if full is not None:
+                new_dates = full['timestamp'].to_numpy(dtype='datetime64[ns]')
+                new_values = full[COLUMNS].to_numpy(dtype=np.float64)
+                complete = True
+            stored = None
+        if stored is not None and not complete:
+            dates, values = stored
+            # The fetched window replaces every stored bar it covers (the last stored bar may
+            # have been an intraday or corrected value); older stored bars are kept
+            keep = dates < new_dates[0] if len(new_dates) else np.ones(len(dates), dtype=bool)
+            new_dates = np.concatenate([np.asarray(dates)[keep], new_dates])
+            new_values = np.concatenate([np.asarray(values)[keep], new_values])
+        complete = complete or bool(meta.get("complete"))
+
+        os.makedirs(STORE_DIR, exist_ok=True)
+        previous = meta.get("generation")
+        generation = (previous or 0) + 1
+        dates_path, values_path = _data_paths(symbol, generation)
+        # Column-major so each price column is a contiguous slice of the memory map
+        _save_array(values_path, np.asfortranarray(new_values))
+        _save_array(dates_path, new_dates)
+        # Switching the meta file publishes both arrays at once
+        write_atomic(_meta_path(symbol), lambda file: json.dump({"fetched_on": today, "rows": int(len(new_dates)),
+                                                                 "generation": generation, "complete": complete}, file), mode='w')
+        if previous is not None:
+            # Readers that already mapped the previous files keep them until they are done
+            for path in _data_paths(symbol, previous):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+        print(f"Price store for {symbol} updated to {len(new_dates)} rows.")
+
+# Daily bars for a ticker as a DataFrame backed by the memory-mapped store
+def load_prices(symbol, rows=HISTORY_ROWS):
+    update_prices(symbol, min_rows=rows or HISTORY_ROWS)
+    stored = read_prices(symbol)
+    if stored is None:
+        raise ValueError(f"No price data available for {symbol}")
+    dates, values = stored
+    if rows:
+        dates, values = dates[-rows:], values[-rows:]
+    data = pd.DataFrame(values, columns=COLUMNS, index=pd.DatetimeIndex(dates, name='timestamp'), copy=False)
+    return data
@@ -0,0 +1,120 @@
+# semantic_cache.py
+import re
+import zlib
+import hashlib
+import threading
+from collections import OrderedDict
+import numpy as np
+
+# Lower-case, drop punctuation and collapse whitespace so trivial rewordings hash the same
+def normalize_prompt(text):
+    return ' '.join(re.sub(r'[^a-z0-9 ]+', ' ', str(text).lower()).split())
+
+# Numbers in a prompt (ages, years, amounts); near-duplicates must agree on them
+def numeric_tokens(text):
+    return tuple(sorted(re.findall(r'\d+', normalize_prompt(text))))
+
+# Words that carry no topic: questions differing only in these are paraphrases
+STOPWORDS = set("""a an the and or of to in on for at by with about from into is are was were be been being
+am do does did can could should would will shall may might must have has had i me my we our you your
+it its this that these those what which who whom how why when where there s t so if than then""".split())
+
+# Topic words of a prompt with a light plural stem ("funds" -> "fund"), or all words if none are left
+def content_words(text):
+    words = normalize_prompt(text).split()
+    content = [word[:-1] if len(word) > 3 and word.endswith('s') and not word.endswith('ss') else word
+               for word in words if word not in STOPWORDS]
+    return content or words
+
+# Cheap local embedding: hashed content words, their bigrams and character trigrams, L2-normalized
+# Words and bigrams weigh twice a trigram, so swapping one topic word ("Roth" for "traditional")
+# moves the vector more than rewording around it ("what's" for "what is")
+def embed(text, dim=512):
+    words = content_words(text)
+    features = [(word, 2.0) for word in words]
+    features += [(f"{first} {second}", 2.0) for first, second in zip(words, words[1:])]
+    for word in words:
+        padded = f" {word} "
+        features += [(padded[i:i + 3], 1.0) for i in range(len(padded) - 2)]
+
+    vector = np.zeros(dim, dtype=np.float32)
+    for feature, weight in features:
+        h = zlib.crc32(feature.encode('utf-8'))
+        vector[h % dim] += weight if (h >> 31) & 1 else -weight # signed hashing limits collision bias
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+# Response cache with exact (normalized hash) and near-duplicate (cosine) lookup
+# A threshold of 1.0 or more disables near-duplicate matching
+# Near-duplicates only match when both prompts contain the same numbers
+class SemanticCache:
+    def __init__(self, maxsize=1000, threshold=0.9, dim=512):
+        self.maxsize = maxsize
+        self.threshold = threshold
+        self.dim = dim
+        self._entries = OrderedDict() # prompt hash -> (row, value), least recently used first
+        self._vectors = np.zeros((maxsize, dim), dtype=np.float32)
+        self._row_keys = [None] * maxsize
+        self._row_numbers = [None] * maxsize
+        self._free_rows = list(range(maxsize - 1, -1, -1))
+        self._lock = threading.Lock()
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+
+    def _key(self, text):
+        return hashlib.sha1(normalize_prompt(text).encode('utf-8')).hexdigest()
+
+    # accept, if given, is called with a near-duplicate's value and can reject the match
+    def get(self, text, accept=None):
+        key = self._key(text)
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.exact_hits += 1
+                return self._entries[key][1]
+
+            if self.threshold < 1.0 and self._entries:
+                # Unused rows are all zeros, so they score 0 and never match
+                similarities = self._vectors @ embed(text, self.dim)
+                row = int(np.argmax(similarities))
+                if (similarities[row] >= self.threshold and self._row_keys[row] is not None
+                        and self._row_numbers[row] == numeric_tokens(text)):
+                    match = self._row_keys[row]
+                    value = self._entries[match][1]
+                    if accept is None or accept(value):
+                        self._entries.move_to_end(match)
+                        self.semantic_hits += 1
+                        return value
+
+            self.misses += 1
+            return None
+
+    def set(self, text, value):
+        key = self._key(text)
+        vector = embed(text, self.dim)
+        with self._lock:
+            if key in self._entries:
+                row = self._entries[key][0]
+            else:
+                if not self._free_rows:
+                    _, (row, _) = self._entries.popitem(last=False) # evict least recently used
+                    self._row_keys[row] = None
+                    self._free_rows.append(row)
+                row = self._free_rows.pop()
+            self._vectors[row] = vector
+            self._row_keys[row] = key
+            self._row_numbers[row] = numeric_tokens(text)
+            self._entries[key] = (row, value)
+            self._entries.move_to_end(key)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.exact_hits + self.semantic_hits + self.misses
+            return {
+                "size": len(self._entries),
+                "exact_hits": self.exact_hits,
+                "semantic_hits": self.semantic_hits,
+                "misses": self.misses,
+                "hit_rate": (self.exact_hits + self.semantic_hits) / lookups if lookups else 0.0
+            }
@@ -0,0 +1,12 @@
+# settings.py
+import json
+
+CONFIG_PATH = 'config.json'
+
+def load_config(path=CONFIG_PATH):
+    with open(path) as config_file:
+        return json.load(config_file)
+
+# config.json is parsed once per process here; modules import this shared dict
+# (from settings import config) instead of opening the file themselves
+config = load_config()
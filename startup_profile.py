@@ -0,0 +1,66 @@
+# startup_profile.py
+import sys
+import json
+import argparse
+import subprocess
+
+"""Report where start-up time goes when a module is imported in a fresh interpreter
+    python startup_profile.py
+    python startup_profile.py --module asgi --top 25 --json
+"""
+
+# Dependencies that should only load on first use (see lazy_imports in config.json)
+HEAVY_MODULES = ["pmdarima", "statsmodels", "sklearn", "yfinance", "matplotlib", "langchain_openai", "langchain_core"]
+
+# Parse the output of python -X importtime
+def import_times(module):
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{result.stderr[-2000:]}")
+
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        rows.append({
+            "module": name.strip(),
+            "depth": (len(name) - len(name.lstrip()) - 1) // 2,
+            "self_ms": int(self_us) / 1000,
+            "cumulative_ms": int(cumulative_us) / 1000
+        })
+    return rows
+
+def profile(module, top=15):
+    rows = import_times(module)
+    loaded = {row["module"].split(".")[0] for row in rows}
+    total = next((row["cumulative_ms"] for row in rows if row["module"] == module), None)
+    return {
+        "module": module,
+        "total_ms": total,
+        "modules_imported": len(rows),
+        "heavy_loaded": [name for name in HEAVY_MODULES if name in loaded],
+        "slowest": sorted(rows, key=lambda row: row["cumulative_ms"], reverse=True)[:top]
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Import-time profile of the app")
+    parser.add_argument("--module", default="app", help="Module to import")
+    parser.add_argument("--top", type=int, default=15, help="Number of slowest imports to list")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    args = parser.parse_args()
+
+    report = profile(args.module, args.top)
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    print(f"import {report['module']}: {report['total_ms']:.0f} ms, {report['modules_imported']} modules")
+    print(f"Heavy dependencies loaded at import: {', '.join(report['heavy_loaded']) or 'none'}")
+    print(f"{'cumulative ms':>14} {'self ms':>9}  module")
+    for row in report["slowest"]:
+        print(f"{row['cumulative_ms']:>14.1f} {row['self_ms']:>9.1f}  {'  ' * row['depth']}{row['module']}")
+
+if __name__ == "__main__":
+    main()
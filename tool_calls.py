@@ -0,0 +1,122 @@
+# tool_calls.py
+import time
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+import metrics
+from settings import config
+
+TOOL_WORKERS = config.get("tool_workers", 4) # tools of one turn running at the same time
+TOOL_TIMEOUT = config.get("tool_timeout", 30) # seconds before a tool's result is given up on
+TOOL_TIMEOUTS = config.get("tool_timeouts", {"forecast_stock": 600}) # per-function overrides
+TOOL_ERROR_MESSAGE = "An error occurred while executing the function."
+TOOL_TIMEOUT_MESSAGE = "The function took too long to respond."
+TOOL_NOT_FOUND_MESSAGE = "Function not found."
+
+_executor = None
+_executor_lock = threading.Lock()
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=TOOL_WORKERS, thread_name_prefix="tool")
+        return _executor
+
+def tool_timeout(name):
+    return TOOL_TIMEOUTS.get(name, TOOL_TIMEOUT)
+
+# Calls requested by an assistant message, from tool_calls (tools API) or a legacy function_call
+def requested_calls(assistant_message):
+    if assistant_message.get("tool_calls"):
+        return [{"id": call.get("id"), "name": call["function"]["name"], "arguments": call["function"].get("arguments") or "{}"}
+                for call in assistant_message["tool_calls"] if call.get("type", "function") == "function"]
+    if assistant_message.get("function_call"):
+        function_call = assistant_message["function_call"]
+        return [{"id": None, "name": function_call["name"], "arguments": function_call.get("arguments") or "{}"}]
+    return []
+
+# Functions return a string, or {"response": ..., "chart_url": ...} when they drew a chart
+def split_result(result):
+    if isinstance(result, dict):
+        return result.get("response"), result.get("chart_url")
+    return result, None
+
+def _outcome(name, result=None, error=None):
+    return {"name": name, "result": error if error is not None else result, "error": error is not None}
+
+def _run(call, function):
+    try:
+        return _outcome(call["name"], function(call["arguments"]))
+    except Exception as e:
+        print(f"Error in {call['name']}: {e}")
+        metrics.increment("function_errors", function=call["name"])
+        return _outcome(call["name"], error=TOOL_ERROR_MESSAGE)
+
+# Run the calls of one turn concurrently; outcomes keep the order of the calls
+# A single call runs inline, as before. A timed-out tool keeps its worker until it returns.
+def run_calls(calls, functions_map):
+    if len(calls) == 1:
+        function = functions_map.get(calls[0]["name"])
+        if function is None:
+            return [_outcome(calls[0]["name"], TOOL_NOT_FOUND_MESSAGE)]
+        return [_run(calls[0], function)]
+
+    executor = _get_executor()
+    start = time.monotonic()
+    futures = [executor.submit(_run, call, functions_map[call["name"]]) if call["name"] in functions_map else None
+               for call in calls]
+    outcomes = []
+    for call, future in zip(calls, futures):
+        if future is None:
+            outcomes.append(_outcome(call["name"], TOOL_NOT_FOUND_MESSAGE))
+            continue
+        try:
+            # Every tool's deadline counts from the start of the turn
+            outcomes.append(future.result(timeout=max(0.0, start + tool_timeout(call["name"]) - time.monotonic())))
+        except FutureTimeoutError:
+            metrics.increment("tool_timeouts", function=call["name"])
+            outcomes.append(_outcome(call["name"], error=TOOL_TIMEOUT_MESSAGE))
+    return outcomes
+
+# Async variant of run_calls; coroutine functions are awaited, the rest run in threads
+async def run_calls_async(calls, functions_map, async_functions=None):
+    async_functions = async_functions or {}
+    slots = asyncio.Semaphore(TOOL_WORKERS)
+
+    async def run_one(call):
+        name = call["name"]
+        if name in async_functions:
+            pending = async_functions[name](call["arguments"])
+        elif name in functions_map:
+            pending = asyncio.to_thread(functions_map[name], call["arguments"])
+        else:
+            return _outcome(name, TOOL_NOT_FOUND_MESSAGE)
+        async with slots:
+            try:
+                return _outcome(name, await asyncio.wait_for(pending, tool_timeout(name)))
+            except asyncio.TimeoutError:
+                metrics.increment("tool_timeouts", function=name)
+                return _outcome(name, error=TOOL_TIMEOUT_MESSAGE)
+            except Exception as e:
+                print(f"Error in {name}: {e}")
+                metrics.increment("function_errors", function=name)
+                return _outcome(name, error=TOOL_ERROR_MESSAGE)
+
+    return await asyncio.gather(*(run_one(call) for call in calls))
+
+def display_name(name):
+    return config.get(name, name)
+
+# Merge the outcomes of one turn into a single response text and the first chart URL
+def merge_outcomes(outcomes):
+    if len(outcomes) == 1:
+        return split_result(outcomes[0]["result"])
+    sections = []
+    chart_url = None
+    for outcome in outcomes:
+        text, chart = split_result(outcome["result"])
+        sections.append(f"{display_name(outcome['name'])}:\n{text}")
+        chart_url = chart_url or chart
+    return "\n\n".join(sections), chart_url